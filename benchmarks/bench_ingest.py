@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# Author: Kyle Bringmans
+
+"""
+Compares the serial loader with the serial and parallel ingest of the message store on a synthetic inbox
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util import get_messages
+from store import build_store
+from synthetic_inbox import write_inbox
+
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+
+
+def timed(f, *args, **kwargs):
+    # Silence the progress output of the loaders while timing
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        f(*args, **kwargs)
+        return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--contacts', type=int, default=200)
+    parser.add_argument('--messages', type=int, default=2000, help='average number of messages per contact')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parsed = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        inbox = os.path.join(tmp, 'inbox')
+        total = write_inbox(inbox, parsed.contacts, parsed.messages)
+        print("Synthetic inbox with {} messages from {} contacts".format(total, parsed.contacts))
+
+        t_loader = timed(get_messages, inbox)
+        t_serial = timed(build_store, inbox, os.path.join(tmp, 'serial'), n_workers=1)
+        t_parallel = timed(build_store, inbox, os.path.join(tmp, 'parallel'), n_workers=parsed.workers)
+
+    print("get_messages:            {:8.2f}s".format(t_loader))
+    print("store ingest, 1 worker:  {:8.2f}s".format(t_serial))
+    print("store ingest, {} workers: {:8.2f}s".format(parsed.workers, t_parallel))
+    print("speedup over serial loader: {:.1f}x, over serial ingest: {:.1f}x"
+          .format(t_loader / t_parallel, t_serial / t_parallel))
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# Author: Kyle Bringmans
+
+"""
+Reports the decoding throughput of every installed JSON backend on a synthetic inbox
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util import JSON_BACKENDS, iter_message_files, set_json_backend, decode_json
+from synthetic_inbox import write_inbox
+
+import argparse
+import tempfile
+import time
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--contacts', type=int, default=100)
+    parser.add_argument('--messages', type=int, default=2000, help='average number of messages per contact')
+    parser.add_argument('--repeat', type=int, default=3, help='decode the inbox this many times per backend')
+    parsed = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        inbox = os.path.join(tmp, 'inbox')
+        total = write_inbox(inbox, parsed.contacts, parsed.messages)
+        # Read all files up front so only decoding is timed
+        documents = []
+        for p, fn in iter_message_files(inbox):
+            with open(inbox + '/' + p + '/' + fn, 'rb') as json_file:
+                documents.append(json_file.read())
+    size_mb = sum(len(d) for d in documents) / 2 ** 20
+    print("Synthetic inbox with {} messages in {} files ({:.1f} MB)".format(total, len(documents), size_mb))
+
+    for backend in JSON_BACKENDS:
+        try:
+            set_json_backend(backend)
+        except ImportError:
+            print("{:10} not installed".format(backend))
+            continue
+        start = time.perf_counter()
+        for _ in range(parsed.repeat):
+            for document in documents:
+                decode_json(document)
+        elapsed = time.perf_counter() - start
+        print("{:10} {:8.1f} MB/s".format(backend, size_mb * parsed.repeat / elapsed))
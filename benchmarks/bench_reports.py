@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# Author: Kyle Bringmans
+
+"""
+Times util.get_messages, the store ingest and every report end to end on synthetic inboxes of several sizes
+
+Every step runs in its own process with profiling enabled, so the reported peak memory belongs to that step alone.
+
+    python benchmarks/bench_reports.py --scales 10k,1m,10m
+"""
+
+import os
+import sys
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic_inbox import write_inbox
+from message_analysis import REPORTS
+
+import argparse
+import json
+import subprocess
+import tempfile
+import time
+
+import yaml
+
+# Runs in a child process: time a single step with the profiler
+STEP_CODE = """
+import sys
+sys.path.insert(0, {root!r})
+from profiling import enable_profiling, stage
+from util import get_params_from_config
+args = get_params_from_config('config.yaml')
+enable_profiling('{profile}')
+with stage('{step}'):
+    if '{step}' == 'get_messages':
+        from util import get_messages
+        get_messages(args['messages_folder'])
+    else:
+        from store import build_store
+        build_store(args['messages_folder'], args['store_folder'], args['n_workers'], args['memory_limit_mb'])
+"""
+
+
+def parse_scale(scale):
+    # '10k' -> 10000, '1m' -> 1000000
+    scale = scale.lower()
+    factor = {'k': 10 ** 3, 'm': 10 ** 6}.get(scale[-1], 1)
+    return int(float(scale.rstrip('km')) * factor)
+
+
+def run_step(cwd, command, profile_path):
+    """
+    Run a benchmark step in a child process and read the profile it wrote
+
+    Returns
+    -------
+    (float, dict)
+        wall time of the process including interpreter start-up and imports, and the profile of the step, see
+        profiling.write_profile
+    """
+    start = time.perf_counter()
+    subprocess.run(command, cwd=cwd, check=True, stdout=subprocess.DEVNULL, env=dict(os.environ, MPLBACKEND='Agg'))
+    elapsed = time.perf_counter() - start
+    with open(profile_path) as profile_file:
+        return elapsed, json.load(profile_file)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', default='10k,1m,10m', help='comma separated total numbers of messages')
+    parser.add_argument('--messages', type=int, default=2000, help='average number of messages per contact')
+    parser.add_argument('--group-ratio', type=float, default=0.1, help='fraction of the folders which are group chats')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--reports', default=','.join(REPORTS), help='comma separated reports to run')
+    parsed = parser.parse_args()
+
+    with open(os.path.join(ROOT, 'config.yaml')) as config_file:
+        config = yaml.safe_load(config_file)
+
+    print("{:>10} {:>20} {:>10} {:>14} {:>10}".format('scale', 'step', 'time (s)', 'messages/s', 'peak MB'))
+    for scale in parsed.scales.split(','):
+        with tempfile.TemporaryDirectory() as tmp:
+            inbox = os.path.join(tmp, 'inbox')
+            n_contacts = max(1, parse_scale(scale) // parsed.messages)
+            total = write_inbox(inbox, n_contacts, parsed.messages, group_ratio=parsed.group_ratio)
+            os.makedirs(os.path.join(tmp, 'images'))
+            with open(os.path.join(tmp, 'config.yaml'), 'w') as config_file:
+                yaml.safe_dump(dict(config, messages_folder=inbox + '/', store_folder=os.path.join(tmp, 'store/'),
+                                    n_workers=parsed.workers, profile=None), config_file)
+
+            profile_path = os.path.join(tmp, 'profile.json')
+            steps = [(step, [sys.executable, '-c', STEP_CODE.format(root=ROOT, step=step, profile=profile_path)])
+                     for step in ('get_messages', 'ingest')]
+            steps += [(name, [sys.executable, os.path.join(ROOT, 'message_analysis.py'), name, '--jobs', '1',
+                              '--profile', profile_path])
+                      for name in parsed.reports.split(',')]
+            for step, command in steps:
+                elapsed, profile = run_step(tmp, command, profile_path)
+                print("{:>10} {:>20} {:>10.2f} {:>14,.0f} {:>10.1f}".format(
+                    scale, step, elapsed, total / elapsed, profile['peak_rss_mb']))
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# Author: Kyle Bringmans
+
+"""
+Measures the import time of every report and the shared loader with python -X importtime
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ('util', 'store', 'cube', 'message_analysis', 'interaction_factor', 'top_contacts_per_month', 'top_contacts',
+           'top_contacts_evolution', 'activity', 'day_schedule', 'groepschat')
+
+
+def import_times(module):
+    """
+    Import a module in a fresh interpreter and collect the -X importtime report
+
+    Parameters
+    ----------
+    module : str
+        name of the module to import
+
+    Returns
+    -------
+    dict
+        imported module -> (self time, cumulative time) in microseconds, the module itself included
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module], cwd=ROOT,
+                            stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, universal_newlines=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5, help='imports per module, the fastest one is reported')
+    parser.add_argument('--top', type=int, default=3, help='number of most expensive dependencies to show')
+    parser.add_argument('--json', help='also write the results to this file, to compare runs over time')
+    parsed = parser.parse_args()
+
+    report = {}
+    for module in MODULES:
+        runs = [import_times(module) for _ in range(parsed.repeat)]
+        best = min(runs, key=lambda times: times[module][1])
+        # Most expensive dependencies by their own import time
+        heaviest = sorted(((name, t[0]) for name, t in best.items() if name != module), key=lambda x: -x[1])
+        report[module] = {'cumulative_us': best[module][1], 'heaviest': heaviest[:parsed.top]}
+        print("{:25} {:8.1f} ms   {}".format(module, best[module][1] / 1000,
+                                            ', '.join('{} {:.1f} ms'.format(n, us / 1000)
+                                                      for n, us in heaviest[:parsed.top])))
+
+    if parsed.json:
+        with open(parsed.json, 'w') as json_file:
+            json.dump(report, json_file, indent=2)
@@ -0,0 +1,54 @@
+# Author: Kyle Bringmans
+
+"""
+Vectorized bucketing of millisecond unix timestamps into hours, weekdays, days, months, quarters and years (all in UTC)
+"""
+
+import numpy as np
+
+MS_PER_HOUR = 3600 * 1000
+MS_PER_DAY = 24 * MS_PER_HOUR
+
+# Buckets bucket_timestamps can compute
+BUCKETS = ('hour', 'weekday', 'day', 'month', 'quarter', 'year')
+
+
+def bucket_timestamps(timestamp_ms, buckets=BUCKETS):
+    """
+    Compute the time buckets of every timestamp
+
+    Parameters
+    ----------
+    timestamp_ms : array_like
+        unix timestamps in milliseconds
+    buckets : tuple of str
+        buckets to compute, any of BUCKETS
+
+    Returns
+    -------
+    dict
+        bucket name -> int64 array with the bin of every timestamp:
+        hour is the hour of the day (0-23), weekday the day of the week (Monday = 0), day the number of days since
+        01/01/1970, month the number of months since 01/1970, quarter the number of quarters since 01/1970 and year the
+        calendar year
+    """
+    timestamp_ms = np.asarray(timestamp_ms, dtype=np.int64)
+    days = timestamp_ms // MS_PER_DAY
+    bins = {}
+    for bucket in buckets:
+        if bucket == 'hour':
+            bins[bucket] = timestamp_ms // MS_PER_HOUR % 24
+        elif bucket == 'weekday':
+            # 01/01/1970 was a Thursday
+            bins[bucket] = (days + 3) % 7
+        elif bucket == 'day':
+            bins[bucket] = days
+        elif bucket == 'month':
+            bins[bucket] = days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+        elif bucket == 'quarter':
+            bins[bucket] = days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64) // 3
+        elif bucket == 'year':
+            bins[bucket] = days.astype('datetime64[D]').astype('datetime64[Y]').astype(np.int64) + 1970
+        else:
+            raise ValueError("Unknown bucket '{}', expected one of {}".format(bucket, BUCKETS))
+    return bins
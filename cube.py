@@ -0,0 +1,210 @@
+# Author: Kyle Bringmans
+
+"""
+Aggregate cube of message counts per thread, hour and sender (the user or someone else), built once from the store
+
+Only the non-empty cells are kept, sorted by thread and hour. Reports which count per hour, weekday, day, month, quarter
+or year are roll-ups of this cube and do not touch the individual messages. Windows whose edges do not fall on whole
+hours are counted from the timestamps of the store instead.
+"""
+
+from buckets import bucket_timestamps, MS_PER_HOUR
+from profiling import stage
+from store import open_derived
+
+import numpy as np
+
+CUBE_FILE = 'cube.npz'
+# Dimensions a cube can be rolled up to
+DIMS = ('thread', 'is_me', 'hour', 'weekday', 'day', 'month', 'quarter', 'year')
+# Approximate size of the temporary arrays build_cube creates per message
+BYTES_PER_ROW = 64
+
+
+def _hour_chunks(store, chunk_rows):
+    """
+    Split the rows of the store into consecutive slices of about chunk_rows rows
+
+    A slice never ends inside an hour of a thread, so every cell of the cube is counted from a single slice. A slice
+    grows beyond chunk_rows by the messages of at most one hour.
+    """
+    start = 0
+    while start < len(store):
+        stop = min(start + chunk_rows, len(store))
+        if stop < len(store) and store.thread[stop] == store.thread[stop - 1]:
+            # Move the end of the slice to the first message of the next hour of the thread
+            t = int(store.thread[stop - 1])
+            next_hour = (int(store.timestamp_ms[stop - 1]) // MS_PER_HOUR + 1) * MS_PER_HOUR
+            stop = int(store.thread_offset[t]) + int(np.searchsorted(store.timestamps(t), next_hour, side='left'))
+        yield slice(start, stop)
+        start = stop
+
+
+def build_cube(store, username, memory_limit_mb=None):
+    """
+    Count the messages of the store per thread, hour since 01/01/1970 and sender
+
+    Parameters
+    ----------
+    store : MessageStore
+        the message store
+    username : str
+        name of the user, messages sent by this user are counted separately
+    memory_limit_mb : int, optional
+        approximate memory budget of the build in megabytes, all messages are counted at once if None
+
+    Returns
+    -------
+    CountCube
+        the cube
+    """
+    user_id = store.identity.sender_id(username)
+    first = int(np.min(store.timestamp_ms)) // MS_PER_HOUR if len(store) else 0
+    span = (int(np.max(store.timestamp_ms)) // MS_PER_HOUR - first + 1) if len(store) else 1
+    # The messages are counted in slices which fit in the memory budget
+    chunk_rows = max(int(memory_limit_mb * 2 ** 20) // BYTES_PER_ROW, 1) if memory_limit_mb else max(len(store), 1)
+    # Cells of every slice, the slices hold consecutive hours so the cells stay sorted
+    parts = {'thread': [np.zeros(0, dtype=np.int32)], 'hour': [np.zeros(0, dtype=np.int64)],
+             'is_me': [np.zeros(0, dtype=bool)], 'count': [np.zeros(0, dtype=np.int64)]}
+    for rows in _hour_chunks(store, chunk_rows):
+        hours = np.asarray(store.timestamp_ms[rows]) // MS_PER_HOUR
+        is_me = store.sender[rows] == user_id
+        # A single key per cell, sorted by thread, hour and sender
+        keys = (np.asarray(store.thread[rows], dtype=np.int64) * span + (hours - first)) * 2 + is_me
+        keys, count = np.unique(keys, return_counts=True)
+        parts['thread'].append((keys // 2 // span).astype(np.int32))
+        parts['hour'].append(keys // 2 % span + first)
+        parts['is_me'].append((keys % 2).astype(bool))
+        parts['count'].append(count.astype(np.int64))
+    # The slices of a column are freed as soon as the column is joined
+    return CountCube(n_threads=len(store.threads), **{name: np.concatenate(parts.pop(name)) for name in list(parts)})
+
+
+def open_cube(store, username, memory_limit_mb=None):
+    """
+    Open the count cube of the store, see store.open_derived
+
+    Parameters
+    ----------
+    store : MessageStore
+        the message store
+    username : str
+        name of the user, messages sent by this user are counted separately
+    memory_limit_mb : int, optional
+        approximate memory budget when the cube has to be built, unbounded if None
+
+    Returns
+    -------
+    CountCube
+        the cube
+    """
+    def load(path):
+        with np.load(path) as data:
+            if str(data['username']) == username and str(data['version']) == str(store.version):
+                return CountCube(data['thread'], data['hour'], data['is_me'], data['count'], int(data['n_threads']))
+
+    def write(path):
+        with stage('aggregate') as record:
+            cube = build_cube(store, username, memory_limit_mb)
+            record['items'] = len(store)
+        np.savez(path, thread=cube.thread, hour=cube.hour, is_me=cube.is_me, count=cube.count,
+                 n_threads=cube.n_threads, username=username, version=str(store.version))
+
+    return open_derived(store, CUBE_FILE, load, write)
+
+
+def group_threads(counts, thread_contact, n_contacts):
+    """
+    Add up the rows of threads which belong to the same contact
+
+    Parameters
+    ----------
+    counts : np.ndarray
+        array with one row per thread
+    thread_contact : np.ndarray
+        contact id of every thread
+    n_contacts : int
+        number of contacts
+
+    Returns
+    -------
+    np.ndarray
+        array with one row per contact
+    """
+    grouped = np.zeros((n_contacts,) + counts.shape[1:], dtype=counts.dtype)
+    np.add.at(grouped, thread_contact, counts)
+    return grouped
+
+
+class CountCube:
+    """
+    Sparse message counts per (thread, hour since 01/01/1970, is_me) cell
+    """
+
+    def __init__(self, thread, hour, is_me, count, n_threads):
+        self.thread = thread
+        self.hour = hour
+        self.is_me = is_me
+        self.count = count
+        self.n_threads = n_threads
+
+    def __len__(self):
+        return len(self.count)
+
+    def rollup(self, by, start=None, stop=None):
+        """
+        Sum the cube over every dimension which is not in by
+
+        Parameters
+        ----------
+        by : tuple of str
+            dimensions to keep, any of DIMS. hour and weekday are cyclic, day, month, quarter and year count from
+            01/01/1970 like buckets.bucket_timestamps
+        start : int, optional
+            only count hours starting at or after this unix time in milliseconds
+        stop : int, optional
+            only count hours starting before this unix time in milliseconds
+
+        Returns
+        -------
+        (dict, np.ndarray)
+            the labels of every kept dimension and the array of counts with one axis per kept dimension. day, month
+            and year span from start to stop if given, otherwise from the first to the last message
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if start is not None:
+            mask &= self.hour * MS_PER_HOUR >= start
+        if stop is not None:
+            mask &= self.hour * MS_PER_HOUR < stop
+        hour_ms = self.hour[mask] * MS_PER_HOUR
+        bins = bucket_timestamps(hour_ms, buckets=[d for d in by if d not in ('thread', 'is_me')])
+
+        labels = {}
+        shape = []
+        flat = np.zeros(mask.sum(), dtype=np.int64)
+        for dim in by:
+            if dim == 'thread':
+                index, labels[dim] = self.thread[mask], np.arange(self.n_threads)
+            elif dim == 'is_me':
+                index, labels[dim] = self.is_me[mask].astype(np.int64), np.array([False, True])
+            elif dim == 'hour':
+                index, labels[dim] = bins[dim], np.arange(24)
+            elif dim == 'weekday':
+                index, labels[dim] = bins[dim], np.arange(7)
+            elif dim in DIMS:
+                # Absolute time dimensions span the requested period, or the data if no period is given
+                if start is not None:
+                    first = bucket_timestamps([start], (dim,))[dim][0]
+                else:
+                    first = bins[dim].min() if len(hour_ms) else 0
+                if stop is not None:
+                    last = bucket_timestamps([stop - 1], (dim,))[dim][0]
+                else:
+                    last = bins[dim].max() if len(hour_ms) else first - 1
+                index, labels[dim] = bins[dim] - first, np.arange(first, last + 1)
+            else:
+                raise ValueError("Unknown dimension '{}', expected one of {}".format(dim, DIMS))
+            flat = flat * len(labels[dim]) + index
+            shape.append(len(labels[dim]))
+        counts = np.bincount(flat, weights=self.count[mask], minlength=int(np.prod(shape)))
+        return labels, counts.astype(np.int64).reshape(shape)
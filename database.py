@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# Author: Kyle Bringmans
+
+"""
+Optional SQLite backend, the message store loaded once into an indexed database the reports can query with SQL
+
+Set 'backend' in the config to 'sqlite' to answer top_contacts, top_contacts_per_month and top_contacts_evolution with
+SQL aggregations instead of the count cube.
+
+The database is saved next to the store and has the tables
+
+    contacts(id, name)                      contacts, threads which share a contact name share an id
+    threads(id, folder, contact)            one row per thread (contact folder)
+    senders(id, name)
+    messages(thread, sender, timestamp_ms, type, reactions, content_length)
+
+with indexes on messages(thread, timestamp_ms) and messages(sender, timestamp_ms). Ad-hoc questions can be asked
+without writing a new script:
+
+    python database.py "SELECT s.name, COUNT(*) FROM messages m JOIN senders s ON s.id = m.sender GROUP BY s.name"
+"""
+
+from util import get_params_from_config
+from store import open_store, open_derived, MESSAGE_TYPES
+from buckets import bucket_timestamps
+
+import argparse
+import os
+import sqlite3
+
+import numpy as np
+from termcolor import colored
+
+DATABASE_FILE = 'messages.sqlite'
+# Number of messages converted to Python rows at once while loading the database
+INSERT_CHUNK_ROWS = 2 ** 16
+
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE contacts (id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE threads (id INTEGER PRIMARY KEY, folder TEXT, contact INTEGER REFERENCES contacts(id));
+CREATE TABLE senders (id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE types (id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE messages (thread INTEGER, sender INTEGER, timestamp_ms INTEGER, type INTEGER, reactions INTEGER,
+                       content_length INTEGER);
+"""
+# SQL expression numbering the period of a message like buckets.bucket_timestamps
+_YEAR_SQL = "CAST(strftime('%Y', m.timestamp_ms / 1000, 'unixepoch') AS INTEGER)"
+_MONTH_SQL = "(({} - 1970) * 12 + CAST(strftime('%m', m.timestamp_ms / 1000, 'unixepoch') AS INTEGER) - 1)".format(
+    _YEAR_SQL)
+_PERIOD_SQL = {'year': _YEAR_SQL, 'quarter': _MONTH_SQL + ' / 3', 'month': _MONTH_SQL}
+_INDEXES = """
+CREATE INDEX messages_thread_time ON messages (thread, timestamp_ms);
+CREATE INDEX messages_sender_time ON messages (sender, timestamp_ms);
+"""
+
+
+def _message_rows(store):
+    # Rows of the messages table, only INSERT_CHUNK_ROWS messages are converted to Python objects at a time
+    for start in range(0, len(store), INSERT_CHUNK_ROWS):
+        rows = slice(start, min(start + INSERT_CHUNK_ROWS, len(store)))
+        content_length = np.diff(store.content_offset[rows.start:rows.stop + 1])
+        yield from zip(store.thread[rows].tolist(), store.sender[rows].tolist(), store.timestamp_ms[rows].tolist(),
+                       store.type[rows].tolist(), store.reactions[rows].tolist(), content_length.tolist())
+
+
+def build_database(store, db_path):
+    """
+    Load every message of the store into a new SQLite database
+
+    Parameters
+    ----------
+    store : MessageStore
+        the message store
+    db_path : str
+        path of the new database file
+    """
+    names, thread_contact = store.contact_ids()
+    with sqlite3.connect(db_path) as connection:
+        # The file is swapped in when it is complete, no journal is needed while loading
+        connection.execute('PRAGMA journal_mode = OFF')
+        connection.execute('PRAGMA synchronous = OFF')
+        connection.executescript(_SCHEMA)
+        connection.execute('INSERT INTO meta VALUES (?, ?)', ('version', str(store.version)))
+        connection.executemany('INSERT INTO contacts VALUES (?, ?)', enumerate(names))
+        connection.executemany('INSERT INTO threads VALUES (?, ?, ?)',
+                               zip(range(len(store.threads)), store.threads, thread_contact.tolist()))
+        connection.executemany('INSERT INTO senders VALUES (?, ?)', enumerate(store.identity.sender_names))
+        connection.executemany('INSERT INTO types VALUES (?, ?)', enumerate(MESSAGE_TYPES))
+        connection.executemany('INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?)', _message_rows(store))
+        # Indexes are built once after loading, which is much faster than updating them on every insert
+        connection.executescript(_INDEXES)
+    connection.close()
+
+
+def open_database(store):
+    """
+    Open the SQLite database of the store, see store.open_derived
+
+    Parameters
+    ----------
+    store : MessageStore
+        the message store
+
+    Returns
+    -------
+    MessageDatabase
+        the database
+    """
+    def load(db_path):
+        database = MessageDatabase(db_path)
+        if database.version == str(store.version):
+            return database
+        database.close()
+
+    def write(db_path):
+        print("Loading message store into '{}'".format(colored(os.path.join(store.path, DATABASE_FILE), 'cyan')))
+        build_database(store, db_path)
+
+    return open_derived(store, DATABASE_FILE, load, write)
+
+
+class MessageDatabase:
+    """
+    Connection to the SQLite database of a message store with the queries used by the reports
+    """
+
+    def __init__(self, db_path):
+        self.path = db_path
+        self.connection = sqlite3.connect(db_path)
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        # Version of the store the database was loaded from
+        self.version = row[0] if row else None
+
+    def close(self):
+        self.connection.close()
+
+    def query(self, sql, parameters=()):
+        """
+        Run any SQL query
+
+        Parameters
+        ----------
+        sql : str
+            the query
+        parameters : tuple or dict
+            values for the placeholders of the query
+
+        Returns
+        -------
+        list
+            the resulting rows as tuples
+        """
+        return self.connection.execute(sql, parameters).fetchall()
+
+    def contact_names(self):
+        """
+        Name of every contact, in order of contact id
+        """
+        return [name for name, in self.query('SELECT name FROM contacts ORDER BY id')]
+
+    def contact_counts(self, n=None):
+        """
+        Number of messages of every contact, most messages first
+
+        Parameters
+        ----------
+        n : int, optional
+            only return the n contacts with the most messages
+
+        Returns
+        -------
+        list
+            (contact name, number of messages) tuples
+        """
+        return self.query("""
+            SELECT c.name, COUNT(*) AS n
+            FROM messages m JOIN threads t ON t.id = m.thread JOIN contacts c ON c.id = t.contact
+            GROUP BY c.id
+            ORDER BY n DESC, c.id
+            LIMIT :n
+        """, {'n': -1 if n is None else n})
+
+    def top_contact_per_window(self, start, stop, width):
+        """
+        Contact with the most messages in consecutive windows [start + i * width, start + (i + 1) * width)
+
+        Parameters
+        ----------
+        start : int
+            start of the first window in milliseconds
+        stop : int
+            no window starts at or after stop
+        width : int
+            length of every window in milliseconds
+
+        Returns
+        -------
+        list
+            (window start, contact name, number of messages) for every window, the first contact with 0 messages if
+            the window is empty
+        """
+        start, width = int(start), int(width)
+        n_windows = max(-(-(int(stop) - start) // width), 0)
+        rows = self.query("""
+            SELECT w, name, n FROM (
+                SELECT w, c.name, n, ROW_NUMBER() OVER (PARTITION BY w ORDER BY n DESC, c.id) AS r
+                FROM (
+                    SELECT (m.timestamp_ms - :start) / :width AS w, t.contact, COUNT(*) AS n
+                    FROM messages m JOIN threads t ON t.id = m.thread
+                    WHERE m.timestamp_ms >= :start AND m.timestamp_ms < :end
+                    GROUP BY w, t.contact
+                ) JOIN contacts c ON c.id = contact
+            )
+            WHERE r = 1
+        """, {'start': start, 'width': width, 'end': start + n_windows * width})
+        top = {w: (name, n) for w, name, n in rows}
+        first = self.query('SELECT name FROM contacts ORDER BY id LIMIT 1')
+        empty = (first[0][0] if first else '', 0)
+        return [(start + w * width,) + top.get(w, empty) for w in range(n_windows)]
+
+    def contact_period_counts(self, period, start, stop):
+        """
+        Number of messages of every contact in every year, quarter or month (UTC) between start and stop
+
+        Parameters
+        ----------
+        period : str
+            'year', 'quarter' or 'month'
+        start : int
+            only count messages sent at or after this unix time in milliseconds
+        stop : int
+            only count messages sent before this unix time in milliseconds
+
+        Returns
+        -------
+        (np.ndarray, np.ndarray)
+            the periods, numbered like buckets.bucket_timestamps, and a (number of contacts, number of periods) array of
+            message counts with rows in order of contact id
+        """
+        first = bucket_timestamps([start], (period,))[period][0]
+        last = bucket_timestamps([stop - 1], (period,))[period][0]
+        labels = np.arange(first, last + 1)
+        counts = np.zeros((len(self.contact_names()), len(labels)), dtype=np.int64)
+        rows = self.query("""
+            SELECT t.contact, {} AS period, COUNT(*)
+            FROM messages m JOIN threads t ON t.id = m.thread
+            WHERE m.timestamp_ms >= :start AND m.timestamp_ms < :stop
+            GROUP BY t.contact, period
+        """.format(_PERIOD_SQL[period]), {'start': int(start), 'stop': int(stop)})
+        for contact, label, n in rows:
+            counts[contact, label - first] = n
+        return labels, counts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('sql', nargs='?', help='query to run, the database is only built if omitted')
+    parsed = parser.parse_args()
+
+    path_to_config = 'config.yaml'
+    args = get_params_from_config(path_to_config)
+
+    store = open_store(args['messages_folder'], args['store_folder'], args['n_workers'], args['memory_limit_mb'])
+    database = open_database(store)
+    if parsed.sql:
+        for row in database.query(parsed.sql):
+            print(*row, sep='\t')
+
+    print("Done")
@@ -5,26 +5,31 @@
 Generates the distribution of interactions throughout the day for the top-N facebook contacts
 """
 
-from util import listdir_no_hidden, get_color, get_params_from_config
-
-import json
-import os
-from datetime import datetime
-import time
-import re
+from util import get_color, get_params_from_config
+from store import open_store
+from cube import open_cube, group_threads
+from topk import top_k
+from render import draw_histogram, save_figure
+from profiling import stage
 
 from pandas.plotting import register_matplotlib_converters
 from matplotlib import pyplot as plt
 import numpy as np
 
 
-if __name__ == '__main__':
-    # Allow usage of pandas arrays in matplotlib
-    register_matplotlib_converters()
-
-    path_to_config = 'config.yaml'
-    args = get_params_from_config(path_to_config)
+def main(args, store, cube):
+    """
+    Plot the distribution of messages over the hours of the day for the top-N contacts
 
+    Parameters
+    ----------
+    args : dict
+        parameters read from the config file
+    store : MessageStore
+        the message store
+    cube : CountCube
+        message counts of the store
+    """
     # Filename to write figure to
     F_NAME = args['f_name']
     # Number of contacts to plot
@@ -32,93 +37,73 @@ if __name__ == '__main__':
     # Make all y-axes same height
     EQ_Y = args['eq_y']
 
-    FOLDERS_PATH = args['messages_folder']
     # Start and end date
     START = '01/09/2019'
     END = '20/08/2020'
 
-    # Get all contacts
-    ppl = listdir_no_hidden(FOLDERS_PATH)
-
-    # Count number of interactions
-    interactions = {}
-    # Iterate over all contacts
-    for p in ppl:
-        # Get proper name of person without suffix
-        try:
-            p_path = FOLDERS_PATH + '/' + p
-            # Iterate over all message files for contact p
-            for fn in listdir_no_hidden(p_path):
-                if 'message' in fn:
-                    with open(p_path + '/' + fn) as json_file:
-                        data = json.load(json_file)
-                        # Add total interactions to existing coun
-                        interactions[p] = interactions.get(p, 0) + len(data['messages'])
-        except FileNotFoundError as error:
-            print("ERROR key {} not found in dict".format(error))
-
-    # Sort contacts by interactions
-    sorted_interactions = sorted(interactions.items(), reverse=True, key=lambda x: x[1])
-
-    # Get all messages for top contacts
+    # Number of messages per hour of the day for every contact, threads with the same contact name are counted together
+    names, thread_contact = store.contact_ids()
+    _, hour_counts = cube.rollup(('thread', 'hour'))
+    hour_counts = group_threads(hour_counts, thread_contact, len(names))
+
+    # Get the messages per hour of the day for the contacts with the most interactions
     messages = {}
-    for p, nr in sorted_interactions[:N]:
-        # Get proper name for person p without suffix and add spaces between name and surname
-        p_rn = re.sub(r"(\w)([A-Z])", r"\1 \2", p.split('_')[0])
+    for c in top_k(group_threads(store.thread_counts(), thread_contact, len(names)), N):
+        p_rn = names[c]
         print('processing {}'.format(p_rn))
-        try:
-            # Iterate over all message files for contact p
-            p_path = FOLDERS_PATH + '/' + p
-            for fn in os.listdir(p_path):
-                if 'message' in fn:
-                    with open(p_path + '/' + fn) as json_file:
-                        data = json.load(json_file)
-                        # Get messages from dataset
-                        messages[p_rn] = messages.get(p_rn, []) + data['messages']
-        except FileNotFoundError as error:
-            print("File {} not found".format(error))
+        messages[p_rn] = hour_counts[c]
 
     # Create bins for histogram
     bins = list(range(24))
 
-    # Plot the data
-    # Create subplots
-    # Create 2 columns of plots
-    WIDTH = 2
-    HEIGHT = len(messages) // 2
-    fig, axes = plt.subplots(HEIGHT, WIDTH, figsize=(20, 15))
-    # Generate random colours for each histogram
-    colors = np.random.rand(len(messages) ** 2, 3)
-    # For each person plot their interaction activity
-    msg_tuples = list(messages.items())
-    for i, ax_lst in enumerate(axes):
-        for j, ax in enumerate(ax_lst):
-            p, mgs = msg_tuples[j + WIDTH * i]
-            # Get timestamps from messages
-            mgs = [int(datetime.utcfromtimestamp(m['timestamp_ms'] / 1000)
-                       .strftime('%H')) for m in mgs]
-            # Plot user data in histogram their name as label and 50% colour transparency
-            # i+1 and j+1 to avoid the zeros since 0*x = x*0 = 0*0 which is not unique
-            ax.hist(mgs, bins=bins, label=p, color=next(get_color()), alpha=0.8, rwidth=0.8, density=True)
-            # Set the x-ticks to the bins used in the histograms
-            ax.xaxis.set_ticks(bins)
-            # Set the x-tick labels to be the formatted bin labels
-            ax.set_xticklabels(bins)
-            # Set y-axis title
-            ax.set_ylabel('% messages')
-            # Show grid
-            ax.grid(True)
-            # Place grid behind other graph elements
-            ax.set_axisbelow(True)
-            # Show the legend
-            ax.legend()
-            # Rotate x-axis labels 90 degrees to make them readable
-            plt.setp(ax.get_xticklabels(), rotation=30, horizontalalignment='right')
-            # Add white space at the bottom to show the x-tick labels
-    plt.tight_layout()
+    with stage('plot'):
+        # Plot the data
+        # Create subplots
+        # Create 2 columns of plots
+        WIDTH = 2
+        HEIGHT = len(messages) // 2
+        fig, axes = plt.subplots(HEIGHT, WIDTH, figsize=(20, 15))
+        # Generate random colours for each histogram
+        colors = np.random.rand(len(messages) ** 2, 3)
+        # For each person plot their interaction activity
+        msg_tuples = list(messages.items())
+        for i, ax_lst in enumerate(axes):
+            for j, ax in enumerate(ax_lst):
+                p, counts = msg_tuples[j + WIDTH * i]
+                # Plot user data in histogram their name as label and 50% colour transparency
+                # i+1 and j+1 to avoid the zeros since 0*x = x*0 = 0*0 which is not unique
+                hist, _ = np.histogram(range(24), bins=bins, weights=counts)
+                draw_histogram(ax, bins, hist, density=True, rwidth=0.8, label=p, color=next(get_color()), alpha=0.8)
+                # Set the x-ticks to the bins used in the histograms
+                ax.xaxis.set_ticks(bins)
+                # Set the x-tick labels to be the formatted bin labels
+                ax.set_xticklabels(bins)
+                # Set y-axis title
+                ax.set_ylabel('% messages')
+                # Show grid
+                ax.grid(True)
+                # Place grid behind other graph elements
+                ax.set_axisbelow(True)
+                # Show the legend
+                ax.legend()
+                # Rotate x-axis labels 90 degrees to make them readable
+                plt.setp(ax.get_xticklabels(), rotation=30, horizontalalignment='right')
+                # Add white space at the bottom to show the x-tick labels
+        plt.tight_layout()
 
     # Save figure
     print("Writing figure to '{}'".format(F_NAME))
-    plt.savefig('images/' + F_NAME)
+    save_figure(fig, F_NAME, args['preview'])
 
     print("Done")
+
+
+if __name__ == '__main__':
+    path_to_config = 'config.yaml'
+    args = get_params_from_config(path_to_config)
+
+    # Allow usage of pandas arrays in matplotlib
+    register_matplotlib_converters()
+
+    store = open_store(args['messages_folder'], args['store_folder'], args['n_workers'], args['memory_limit_mb'])
+    main(args, store, open_cube(store, args['username'], args['memory_limit_mb']))
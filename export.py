@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# Author: Kyle Bringmans
+
+"""
+Exports the message store as a Parquet (or Arrow IPC) dataset partitioned by year and month, for ad-hoc analysis
+
+Every row is one message with the columns thread, sender, timestamp_ms, type, content_length (bytes of utf-8 content)
+and reactions. thread, sender and type are dictionary encoded. The dataset is written hive style
+(year=2020/month=3/part-0.parquet) so readers like pyarrow.dataset, pandas, polars or duckdb only open the columns and
+months a query needs. Requires pyarrow.
+"""
+
+from util import get_params_from_config
+from store import open_store, MESSAGE_TYPES
+from cube import open_cube
+
+import numpy as np
+from termcolor import colored
+
+# File formats of the export -> pyarrow.dataset format name
+EXPORT_FORMATS = {'parquet': 'parquet', 'arrow': 'ipc'}
+
+
+def export_dataset(store, out_path, file_format='parquet'):
+    """
+    Write every message of the store as a dataset partitioned by year and month (UTC) of the send time
+
+    Parameters
+    ----------
+    store : MessageStore
+        the message store
+    out_path : str
+        folder to write the dataset to, partitions which already exist are replaced
+    file_format : str
+        one of EXPORT_FORMATS
+
+    Returns
+    -------
+    int
+        number of exported messages
+
+    Raises
+    ------
+    ImportError
+        if pyarrow is not installed
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+    except ImportError:
+        raise ImportError("Exporting the message store requires pyarrow, install it with 'pip install pyarrow'")
+
+    timestamp_ms = np.asarray(store.timestamp_ms)
+    # Months since 01/1970
+    months = timestamp_ms.astype('datetime64[ms]').astype('datetime64[M]').astype(np.int64)
+    table = pa.table({
+        'thread': pa.DictionaryArray.from_arrays(np.asarray(store.thread), store.threads),
+        'sender': pa.DictionaryArray.from_arrays(np.asarray(store.sender), store.identity.sender_names),
+        'timestamp_ms': timestamp_ms,
+        'type': pa.DictionaryArray.from_arrays(np.asarray(store.type), list(MESSAGE_TYPES)),
+        'content_length': np.diff(store.content_offset),
+        'reactions': np.asarray(store.reactions),
+        'year': (months // 12 + 1970).astype(np.int16),
+        'month': (months % 12 + 1).astype(np.int8),
+    })
+    ds.write_dataset(table, out_path, format=EXPORT_FORMATS[file_format], partitioning=['year', 'month'],
+                     partitioning_flavor='hive', existing_data_behavior='delete_matching')
+    return len(table)
+
+
+def main(args, store, cube):
+    """
+    Export the message store to the export folder of the config
+
+    Parameters
+    ----------
+    args : dict
+        parameters read from the config file
+    store : MessageStore
+        the message store
+    cube : CountCube
+        message counts of the store
+    """
+    EXPORT_FOLDER = args['export_folder']
+    EXPORT_FORMAT = args['export_format']
+
+    print("Exporting messages to '{}'".format(colored(EXPORT_FOLDER, 'cyan')))
+    n = export_dataset(store, EXPORT_FOLDER, EXPORT_FORMAT)
+    print("Exported {} messages as {}".format(colored(n, 'red'), colored(EXPORT_FORMAT, 'yellow')))
+
+    print("Done")
+
+
+if __name__ == '__main__':
+    path_to_config = 'config.yaml'
+    args = get_params_from_config(path_to_config)
+
+    store = open_store(args['messages_folder'], args['store_folder'], args['n_workers'], args['memory_limit_mb'])
+    main(args, store, open_cube(store, args['username'], args['memory_limit_mb']))
@@ -2,16 +2,93 @@
 # Author: Kyle Bringmans
 
 """
-Plots the amount of user interactions with the chat for each user sorted by amount of interactions
+Plots the amount of user interactions with a group chat for each user sorted by amount of interactions
 """
 
 from util import get_params_from_config
-
-import json
-import os
+from store import open_store
+from cube import open_cube
+from render import save_figure
+from profiling import stage
+from groups import open_group_table
 
 from pandas.plotting import register_matplotlib_converters
 from matplotlib import pyplot as plt
+import numpy as np
+from termcolor import colored
+
+
+def main(args, store, cube):
+    """
+    Plot the number of messages of every member of the group chat
+
+    Parameters
+    ----------
+    args : dict
+        parameters read from the config file
+    store : MessageStore
+        the message store
+    cube : CountCube
+        message counts of the store
+    """
+    F_NAME = args['f_name']
+    # Thread folder name of the group chat to plot, the group with the most messages if not set
+    GROUPCHAT_NAME = args.get('groupchat')
+
+    # Count the messages of every member of every group chat
+    table = open_group_table(store, args['memory_limit_mb'])
+    print("Found {} group chats".format(colored(len(table.groups), 'red')))
+    if not len(table.groups):
+        print("Done")
+        return
+
+    if GROUPCHAT_NAME:
+        if GROUPCHAT_NAME not in store.threads:
+            raise ValueError("Group chat folder '{}' not found in '{}'".format(GROUPCHAT_NAME, args['messages_folder']))
+        if store.threads.index(GROUPCHAT_NAME) not in table.groups:
+            raise ValueError("Folder '{}' is not a group chat, it has fewer than 3 participants".format(GROUPCHAT_NAME))
+        i = table.group_index(store.threads.index(GROUPCHAT_NAME))
+    else:
+        i = int(np.argmax(table.totals()))
+    t = int(table.groups[i])
+    print("Plotting activity in {}".format(colored(store.contact_name(t), 'yellow')))
+
+    # Members are already sorted by number of sent messages
+    sender_ids, counts = table.members(t)
+    x, y = [store.identity.sender_names[s] for s in sender_ids], list(counts)
+
+    with stage('plot'):
+        # Plot data
+        fig, ax = plt.subplots(1, 1)
+        plt.scatter(x, y, marker='x', color='r')
+        plt.plot(x, y)
+
+        line_y = [table.cutoffs()[i]] * len(y)
+
+        plt.plot(x, line_y, label='Admin cut-off', color='green')
+
+        plt.legend()
+
+        # Configuration options
+        # Add grid
+        plt.grid(True)
+        # Move grid behind other graph elements
+        ax.set_axisbelow(True)
+        # Add more whitespace below plots to show full labels
+        plt.gcf().subplots_adjust(bottom=0.25)
+        # Rotate x-axis labels so they are all readable
+        plt.setp(ax.get_xticklabels(), rotation=30, horizontalalignment='right')
+        # Rename y-axis
+        ax.set_ylabel('# messages')
+        # Set title
+        plt.title("Activity in groupchat")
+
+    # Save figure
+    print("Writing figure to '{}'".format(F_NAME))
+    save_figure(fig, F_NAME, args['preview'])
+
+    print("Done")
+
 
 if __name__ == '__main__':
     # Allow usage of pandas arrays in matplotlib
@@ -20,59 +97,5 @@ if __name__ == '__main__':
     path_to_config = 'config.yaml'
     args = get_params_from_config(path_to_config)
 
-    N = args['n']
-    F_NAME = args['f_name']
-    GROUPCHAT_NAME = 'yass_4nFvy2IPiQ'
-    PATH = args['messages_folder'] + GROUPCHAT_NAME
-
-    # Find all users in groupchat
-    messages = []
-    for fn in os.listdir(PATH):
-        if 'message' in fn:
-            with open(PATH + '/' + fn) as json_file:
-                data = json.load(json_file)
-                messages = data['messages']
-                ppl = [p['name'] for p in data['participants']]
-
-    # Count number of messages per person
-    info = {}
-    for message in messages:
-        sender = message['sender_name']
-        info[sender] = info.get(sender, 0) + 1
-
-    # Sort users by number of sent messages
-    info = sorted(info.items(), reverse=True, key=lambda p: p[1])
-
-    # Prepare data for plot
-    x, y = list(zip(*info))
-
-    # Plot data
-    fig, ax = plt.subplots(1, 1)
-    plt.scatter(x, y, marker='x', color='r')
-    plt.plot(x, y)
-
-    line_y = [max(y) * 0.375] * len(y)
-
-    plt.plot(x, line_y, label='Admin cut-off', color='green')
-
-    plt.legend()
-
-    # Configuration options
-    # Add grid
-    plt.grid(True)
-    # Move grid behind other graph elements
-    ax.set_axisbelow(True)
-    # Add more whitespace below plots to show full labels
-    plt.gcf().subplots_adjust(bottom=0.25)
-    # Rotate x-axis labels so they are all readable
-    plt.setp(ax.get_xticklabels(), rotation=30, horizontalalignment='right')
-    # Rename y-axis
-    ax.set_ylabel('# messages')
-    # Set title
-    plt.title("Activity in groupchat")
-
-    # Save figure
-    print("Writing figure to '{}'".format(F_NAME))
-    plt.savefig('images/' + F_NAME)
-
-    print("Done")
+    store = open_store(args['messages_folder'], args['store_folder'], args['n_workers'], args['memory_limit_mb'])
+    main(args, store, open_cube(store, args['username'], args['memory_limit_mb']))
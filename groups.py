@@ -0,0 +1,173 @@
+# Author: Kyle Bringmans
+
+"""
+Per-sender message counts and activity cut-offs of every group chat, built once from the store
+
+A group chat is a thread with more than two participants. The table has one row per (group, sender) with the number of
+messages the sender wrote in the group, sorted by group and by number of messages within a group.
+"""
+
+from store import open_derived
+
+import numpy as np
+
+GROUPS_FILE = 'groups.npz'
+# Senders with fewer messages than this fraction of the most active member of a group fall below the cut-off
+CUTOFF_FACTOR = 0.375
+# Approximate size of the temporary arrays build_group_table creates per message
+BYTES_PER_ROW = 16
+
+
+def build_group_table(store, memory_limit_mb=None):
+    """
+    Count the messages of every sender in every group chat of the store
+
+    Parameters
+    ----------
+    store : MessageStore
+        the message store
+    memory_limit_mb : int, optional
+        approximate memory budget of the build in megabytes, the messages of a group are counted at once if None
+
+    Returns
+    -------
+    GroupTable
+        the table
+    """
+    groups = np.array([t for t, names in enumerate(store.participants()) if len(names) > 2], dtype=np.int64)
+    n_senders = max(len(store.senders), 1)
+    # The messages of a group are counted in slices which fit in the memory budget
+    chunk_rows = max(int(memory_limit_mb * 2 ** 20) // BYTES_PER_ROW, 1) if memory_limit_mb else max(len(store), 1)
+    group, sender, count = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+    for t in groups:
+        rows = store.thread_rows(t)
+        counts = np.zeros(n_senders, dtype=np.int64)
+        for start in range(rows.start, rows.stop, chunk_rows):
+            counts += np.bincount(store.sender[start:min(start + chunk_rows, rows.stop)], minlength=n_senders)
+        senders = np.flatnonzero(counts)
+        # Most active sender first within every group
+        senders = senders[np.argsort(-counts[senders], kind='stable')]
+        group.append(np.full(len(senders), t, dtype=np.int64))
+        sender.append(senders)
+        count.append(counts[senders])
+    return GroupTable(np.concatenate(group).astype(np.int32), np.concatenate(sender).astype(np.int32),
+                      np.concatenate(count), groups.astype(np.int32))
+
+
+def open_group_table(store, memory_limit_mb=None):
+    """
+    Open the group table of the store, see store.open_derived
+
+    Parameters
+    ----------
+    store : MessageStore
+        the message store
+    memory_limit_mb : int, optional
+        approximate memory budget when the table has to be built, unbounded if None
+
+    Returns
+    -------
+    GroupTable
+        the table
+    """
+    def load(path):
+        with np.load(path) as data:
+            if str(data['version']) == str(store.version):
+                return GroupTable(data['group'], data['sender'], data['count'], data['groups'])
+
+    def write(path):
+        table = build_group_table(store, memory_limit_mb)
+        np.savez(path, group=table.group, sender=table.sender, count=table.count, groups=table.groups,
+                 version=str(store.version))
+
+    return open_derived(store, GROUPS_FILE, load, write)
+
+
+class GroupTable:
+    """
+    Message counts per (group thread, sender), sorted by group and by most messages first
+    """
+
+    def __init__(self, group, sender, count, groups):
+        self.group = group
+        self.sender = sender
+        self.count = count
+        # Thread id of every group chat, including groups without messages
+        self.groups = groups
+        self.offset = np.searchsorted(group, np.append(groups, np.iinfo(np.int32).max))
+
+    def __len__(self):
+        return len(self.count)
+
+    def group_index(self, t):
+        """
+        Position of a group in groups
+
+        Parameters
+        ----------
+        t : int
+            thread id of the group
+
+        Returns
+        -------
+        int
+            index into groups and the per-group arrays of totals and cutoffs
+
+        Raises
+        ------
+        ValueError
+            if thread t is not a group chat
+        """
+        i = int(np.searchsorted(self.groups, t))
+        if i == len(self.groups) or self.groups[i] != t:
+            raise ValueError("Thread {} is not a group chat".format(t))
+        return i
+
+    def members(self, t):
+        """
+        Senders of a group and their number of messages, most active first
+
+        Parameters
+        ----------
+        t : int
+            thread id of the group
+
+        Returns
+        -------
+        (np.ndarray, np.ndarray)
+            sender ids and number of messages
+
+        Raises
+        ------
+        ValueError
+            if thread t is not a group chat
+        """
+        i = self.group_index(t)
+        rows = slice(self.offset[i], self.offset[i + 1])
+        return self.sender[rows], self.count[rows]
+
+    def totals(self):
+        """
+        Number of messages in every group
+
+        Returns
+        -------
+        np.ndarray
+            number of messages per group, in the order of groups
+        """
+        return np.bincount(np.searchsorted(self.groups, self.group), weights=self.count,
+                           minlength=len(self.groups)).astype(np.int64)
+
+    def cutoffs(self):
+        """
+        Activity cut-off of every group, CUTOFF_FACTOR times the number of messages of its most active member
+
+        Returns
+        -------
+        np.ndarray
+            cut-off per group, in the order of groups
+        """
+        most_active = np.zeros(len(self.groups), dtype=np.int64)
+        has_members = np.diff(self.offset) > 0
+        most_active[has_members] = self.count[self.offset[:-1][has_members]]
+        return most_active * CUTOFF_FACTOR
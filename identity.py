@@ -0,0 +1,147 @@
+# Author: Kyle Bringmans
+
+"""
+Integer ids and display names of the contacts and senders of the store, computed once and saved next to the store
+
+Facebook writes the UTF-8 bytes of names as if every byte were a latin-1 character, so 'Zoë' is exported as 'ZoÃ«'.
+The table undoes this once for every name, and contact folders are cleaned up to display names once, so reports look
+names up by id instead of cleaning strings over and over.
+"""
+
+from store import open_derived
+
+import json
+import re
+
+import numpy as np
+
+IDENTITY_FILE = 'identity.json'
+
+
+def fix_encoding(text):
+    """
+    Repair text which Facebook exported as UTF-8 bytes read as latin-1
+
+    Parameters
+    ----------
+    text : str
+        the exported text
+
+    Returns
+    -------
+    str
+        the repaired text, text which is not mangled this way is returned unchanged
+    """
+    try:
+        return text.encode('latin-1').decode('utf-8')
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return text
+
+
+def display_name(folder):
+    """
+    Display name of the contact of a thread folder
+
+    Parameters
+    ----------
+    folder : str
+        folder name of the thread, e.g. 'JohnDoe_a1b2c3'
+
+    Returns
+    -------
+    str
+        the name without folder suffix and with a space between name and surname, e.g. 'John Doe'
+    """
+    return re.sub(r"(\w)([A-Z])", r"\1 \2", fix_encoding(folder.split('_')[0]))
+
+
+def build_identity_table(store):
+    """
+    Number the contacts and repair the sender names of the store
+
+    Parameters
+    ----------
+    store : MessageStore
+        the message store
+
+    Returns
+    -------
+    IdentityTable
+        the table
+    """
+    contacts = []
+    contact_ids = {}
+    thread_contact = np.zeros(len(store.threads), dtype=np.int64)
+    for t, p in enumerate(store.threads):
+        name = display_name(p)
+        if name not in contact_ids:
+            contact_ids[name] = len(contacts)
+            contacts.append(name)
+        thread_contact[t] = contact_ids[name]
+    return IdentityTable(contacts, thread_contact, [fix_encoding(sender) for sender in store.senders])
+
+
+def open_identity_table(store):
+    """
+    Open the identity table of the store, see store.open_derived
+
+    Parameters
+    ----------
+    store : MessageStore
+        the message store
+
+    Returns
+    -------
+    IdentityTable
+        the table
+    """
+    def load(path):
+        with open(path) as table_file:
+            data = json.load(table_file)
+        if data['version'] == str(store.version):
+            return IdentityTable(data['contacts'], np.array(data['thread_contact'], dtype=np.int64),
+                                 data['sender_names'])
+
+    def write(path):
+        table = build_identity_table(store)
+        with open(path, 'w') as table_file:
+            json.dump({'contacts': table.contacts, 'thread_contact': table.thread_contact.tolist(),
+                       'sender_names': table.sender_names, 'version': str(store.version)}, table_file)
+
+    return open_derived(store, IDENTITY_FILE, load, write)
+
+
+class IdentityTable:
+    """
+    Contact id of every thread and display name of every contact and sender
+    """
+
+    def __init__(self, contacts, thread_contact, sender_names):
+        # Display names of the contacts, threads which share a display name are the same contact
+        self.contacts = contacts
+        self.thread_contact = thread_contact
+        # Repaired name of every sender id of the store
+        self.sender_names = sender_names
+        self._sender_ids = {name: s for s, name in enumerate(sender_names)}
+
+    def contact_name(self, t):
+        """
+        Display name of the contact of thread t
+        """
+        return self.contacts[self.thread_contact[t]]
+
+    def sender_id(self, name):
+        """
+        Id of the sender with the given name
+
+        Parameters
+        ----------
+        name : str
+            name of the sender, either as exported or repaired
+
+        Returns
+        -------
+        int
+            the sender id, -1 if nobody of that name sent a message
+        """
+        return self._sender_ids.get(fix_encoding(name), -1)
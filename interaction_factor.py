@@ -2,77 +2,99 @@
 # Author: Kyle Bringmans
 
 """
-Generates activity histograms of the top-N most contacted facebook friends
+Prints the interaction factor (messages received per message sent) of the top-N most contacted facebook friends, overall
+and per month
 """
 
-from util import get_messages, get_params_from_config
+from util import get_params_from_config
+from store import open_store
+from cube import open_cube
 
-import os
-import sys
-import json
 from datetime import datetime
-import time
-import re
 
-from pandas.plotting import register_matplotlib_converters
+import numpy as np
 from termcolor import colored
 
 
-if __name__ == '__main__':
-    path_to_config = 'config.yaml'
-    args = get_params_from_config(path_to_config)
+def interaction_factors(received, sent):
+    """
+    Number of messages received per message sent
+
+    Parameters
+    ----------
+    received : array_like
+        number of messages received
+    sent : array_like
+        number of messages sent
 
-    # Allow usage of pandas arrays in matplotlib
-    register_matplotlib_converters()
+    Returns
+    -------
+    np.ndarray
+        the factors rounded to 3 decimals, inf if nothing was sent and nan if nothing was sent nor received
+    """
+    received = np.asarray(received, dtype=np.float64)
+    sent = np.asarray(sent, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.round(received / sent, 3)
 
+
+def main(args, store, cube):
+    """
+    Print the interaction factor of the top-N contacts, overall and per month
+
+    Parameters
+    ----------
+    args : dict
+        parameters read from the config file
+    store : MessageStore
+        the message store
+    cube : CountCube
+        message counts of the store
+    """
     # Assign arguments to variables
     F_NAME = args['f_name']
     N = args['n']
     USERNAME = args['username']
-    FOLDERS_PATH = args['messages_folder']
 
     # Start and end date
     START = '01/09/2019'
     END = '20/08/2020'
 
-    # factor with which unix timestamps differ from millisecond interval
-    MS_OFFSET_FACTOR = 1000
-
-    # Count number of interactions
-    interactions = get_messages(FOLDERS_PATH, interactions=True, clean_names=False)
+    # Number of messages received from and sent to every thread
+    _, sent_counts = cube.rollup(('thread', 'is_me'))
+    factors = interaction_factors(sent_counts[:, 0], sent_counts[:, 1])
 
     # Sort contacts by interactions
     print("Calculating top {} contacts".format(colored(N, 'red')))
-    sorted_interactions = sorted(interactions.items(), reverse=True, key=lambda x: x[1])
-
-    # Get all messages for top contacts
-    messages = {}
-    for p, nr in sorted_interactions[:N]:
-        # Get proper name for person p without suffix and add spaces between name and surname
-        p_rn = re.sub(r"(\w)([A-Z])", r"\1 \2", p.split('_')[0])
-        print('Retrieving messages to/from {}'.format(colored(p_rn, 'yellow')))
-        try:
-            # Iterate over all message files for contact p
-            p_path = FOLDERS_PATH + '/' + p
-            for fn in os.listdir(p_path):
-                if 'message' in fn:
-                    with open(p_path + '/' + fn) as json_file:
-                        data = json.load(json_file)
-                        # Get messages from dataset
-                        messages[p_rn] = messages.get(p_rn, []) + data['messages']
-        except FileNotFoundError as error:
-            print("File {} not found".format(error))
-            sys.exit()
-
-    for p, mgs in messages.items():
-        a, b = 0, 0
-        for m in mgs:
-            try:
-                if m['sender_name'] == USERNAME:
-                    a += 1
-                else:
-                    b += 1
-            except KeyError as error:
-                print(error)
-        interact_f = round(b / a, 3)
-        print("Interaction factor for {} = {}".format(colored(p, 'yellow'), colored(interact_f, 'cyan')))
+    top_threads = store.top_threads(N)
+
+    for t in top_threads:
+        # Get proper name for contact without suffix and add spaces between name and surname
+        p = store.contact_name(t)
+        print("Interaction factor for {} = {}".format(colored(p, 'yellow'), colored(factors[t], 'cyan')))
+
+    # Number of messages received from and sent to every thread per month from the month of the start date up to and
+    # including the month of the end date. The cube counts whole UTC hours, so the period is bounded by UTC months
+    # instead of the local dates
+    first_month = np.datetime64(datetime.strptime(START, "%d/%m/%Y").strftime('%Y-%m'), 'M')
+    last_month = np.datetime64(datetime.strptime(END, "%d/%m/%Y").strftime('%Y-%m'), 'M')
+    month_start = int(first_month.astype('datetime64[ms]').astype(np.int64))
+    month_stop = int((last_month + 1).astype('datetime64[ms]').astype(np.int64))
+    labels, monthly_counts = cube.rollup(('thread', 'month', 'is_me'), start=month_start, stop=month_stop)
+    monthly_factors = interaction_factors(monthly_counts[..., 0], monthly_counts[..., 1])
+
+    print("Interaction factor per month")
+    for i, month in enumerate(labels['month']):
+        # Months are counted from 01/1970
+        month = str(np.datetime64(int(month), 'M'))
+        factors_f = ['{} = {}'.format(store.contact_name(t), colored(monthly_factors[t, i], 'cyan'))
+                     for t in top_threads]
+        print("{}: {}".format(colored(month, 'yellow'), ', '.join(factors_f)))
+
+
+if __name__ == '__main__':
+    path_to_config = 'config.yaml'
+    args = get_params_from_config(path_to_config)
+
+    store = open_store(args['messages_folder'], args['store_folder'], args['n_workers'], args['memory_limit_mb'])
+    main(args, store, open_cube(store, args['username'], args['memory_limit_mb']))
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# Author: Kyle Bringmans
+
+"""
+Runs one report, or all of them, from a single load of the message store
+
+    python message_analysis.py {activity,day-schedule,top-contacts,evolution,per-month,interaction-factor,groupchat,all}
+    python message_analysis.py export
+"""
+
+from util import get_params_from_config
+from store import open_store, MessageStore
+from cube import open_cube
+from profiling import stage, enable_profiling, take_records, add_records
+
+import argparse
+import importlib
+from concurrent.futures import ProcessPoolExecutor
+
+# Report name on the command line -> module implementing it
+REPORTS = {
+    'activity': 'activity',
+    'day-schedule': 'day_schedule',
+    'top-contacts': 'top_contacts',
+    'evolution': 'top_contacts_evolution',
+    'per-month': 'top_contacts_per_month',
+    'interaction-factor': 'interaction_factor',
+    'groupchat': 'groepschat',
+}
+# Commands which are not part of 'all'
+COMMANDS = {
+    'export': 'export',
+}
+# Reports which only print text, these always run in the main process
+TEXT_REPORTS = ('per-month', 'interaction-factor') + tuple(COMMANDS)
+
+
+def run_report(name, args, store, cube):
+    """
+    Run a single report
+
+    Parameters
+    ----------
+    name : str
+        name of the report, a key of REPORTS or COMMANDS
+    args : dict
+        parameters read from the config file
+    store : MessageStore
+        the message store
+    cube : CountCube
+        message counts of the store
+    """
+    module = REPORTS.get(name) or COMMANDS[name]
+    # Every report writes the figure it would write when run as a script
+    with stage(name):
+        importlib.import_module(module).main(dict(args, f_name=module + '.png'), store, cube)
+    if name not in TEXT_REPORTS:
+        from matplotlib import pyplot as plt
+        plt.close('all')
+
+
+def _render(name, args):
+    # Runs in a worker process, the store already exists so opening it only memory-maps the columns
+    if args['profile']:
+        enable_profiling()
+        # Forked workers inherit the records of the main process
+        take_records()
+    store = MessageStore(args['store_folder'])
+    run_report(name, args, store, open_cube(store, args['username'], args['memory_limit_mb']))
+    # Stages recorded here are added to the profile of the main process
+    return take_records()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('report', choices=list(REPORTS) + ['all'] + list(COMMANDS),
+                        help="report to run, 'all' runs every report")
+    parser.add_argument('--config', default='config.yaml', help='path to the config file')
+    parser.add_argument('--preview', action='store_true', help='write low resolution figures')
+    parser.add_argument('--profile', metavar='PATH', help='write the time and memory of every stage to this JSON file')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help="processes used to render the figures of 'all', defaults to n_workers of the config")
+    parsed = parser.parse_args()
+
+    args = get_params_from_config(parsed.config)
+    args['preview'] = args['preview'] or parsed.preview
+    if parsed.profile:
+        args['profile'] = parsed.profile
+        enable_profiling(parsed.profile)
+    reports = list(REPORTS) if parsed.report == 'all' else [parsed.report]
+    jobs = parsed.jobs if parsed.jobs is not None else args['n_workers']
+
+    if any(name not in TEXT_REPORTS for name in reports):
+        from pandas.plotting import register_matplotlib_converters
+        # Allow usage of pandas arrays in matplotlib
+        register_matplotlib_converters()
+
+    # Load the data once for every report
+    store = open_store(args['messages_folder'], args['store_folder'], args['n_workers'], args['memory_limit_mb'])
+    cube = open_cube(store, args['username'], args['memory_limit_mb'])
+
+    figures = [name for name in reports if name not in TEXT_REPORTS]
+    if len(figures) > 1 and jobs != 1:
+        # Render the figures in worker processes while the text reports run here
+        with ProcessPoolExecutor(max_workers=jobs or None) as pool:
+            rendered = [pool.submit(_render, name, args) for name in figures]
+            for name in reports:
+                if name in TEXT_REPORTS:
+                    run_report(name, args, store, cube)
+            for future in rendered:
+                add_records(future.result())
+    else:
+        for name in reports:
+            run_report(name, args, store, cube)
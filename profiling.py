@@ -0,0 +1,128 @@
+# Author: Kyle Bringmans
+
+"""
+Per-stage wall time, peak memory and item counts, written as a JSON report to compare runs
+
+Profiling is off until enable_profiling is called, which get_params_from_config does when the config sets 'profile' to
+the path of the report. Stages are recorded with
+
+    with stage('parse') as record:
+        ...
+        record['items'] = n_messages
+
+and nest, a stage opened inside 'activity' is recorded as 'activity/savefig'. The report is written when the process
+exits.
+"""
+
+import atexit
+from contextlib import contextmanager
+import json
+import resource
+import sys
+import time
+
+from termcolor import colored
+
+# Recorded stages, None while profiling is off
+_profile = {'records': None, 'stack': [], 'start': None, 'started': None, 'path': None}
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    return round(max(own, children) / 2 ** 20, 1)
+
+
+def enable_profiling(path=None):
+    """
+    Start recording stages
+
+    Parameters
+    ----------
+    path : str, optional
+        write the report to this file when the process exits, the records are only kept in memory if None
+    """
+    if _profile['records'] is None:
+        _profile['records'] = []
+        _profile['start'] = time.perf_counter()
+        _profile['started'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        atexit.register(_write_at_exit)
+    if path:
+        _profile['path'] = path
+
+
+def _write_at_exit():
+    if _profile['path']:
+        write_profile(_profile['path'])
+
+
+@contextmanager
+def stage(name):
+    """
+    Record the wall time and peak memory of the code in the with block
+
+    Parameters
+    ----------
+    name : str
+        name of the stage, e.g. 'listdir', 'parse', 'aggregate', 'plot' or 'savefig'
+
+    Returns
+    -------
+    dict
+        the record of the stage, set its 'items' key to the number of items the stage processed
+    """
+    record = {}
+    if _profile['records'] is None:
+        yield record
+        return
+    _profile['stack'].append(name)
+    record['stage'] = '/'.join(_profile['stack'])
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        _profile['stack'].pop()
+        record['wall_s'] = round(time.perf_counter() - start, 4)
+        record['peak_rss_mb'] = _peak_rss_mb()
+        _profile['records'].append(record)
+
+
+def take_records():
+    """
+    Remove and return the stages recorded so far, used to send the records of worker processes to the main process
+    """
+    records = _profile['records'] or []
+    if _profile['records'] is not None:
+        _profile['records'] = []
+    return records
+
+
+def add_records(records):
+    """
+    Add stages recorded in another process
+    """
+    if _profile['records'] is not None:
+        _profile['records'].extend(records)
+
+
+def write_profile(path):
+    """
+    Write the recorded stages as a JSON report
+
+    Parameters
+    ----------
+    path : str
+        file to write the report to
+    """
+    report = {
+        'argv': sys.argv,
+        'started': _profile['started'],
+        'wall_s': round(time.perf_counter() - _profile['start'], 4),
+        'peak_rss_mb': _peak_rss_mb(),
+        'stages': _profile['records'],
+    }
+    with open(path, 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+    print("Wrote profile to '{}'".format(colored(path, 'cyan')))
@@ -0,0 +1,77 @@
+# Author: Kyle Bringmans
+
+"""
+Headless figure rendering shared by the report scripts
+
+Importing this module pins matplotlib to the non-interactive Agg backend, so reports import it before pyplot.
+Histograms are counted with numpy up front and drawn as a single artist instead of one patch per bin, and figures can be
+saved at a low resolution to preview a full report set quickly.
+"""
+
+from profiling import stage
+
+import matplotlib
+
+# Figures are only written to files, never shown
+matplotlib.use('Agg')
+
+import numpy as np  # noqa: E402
+
+# Folder figures are written to
+FIGURE_FOLDER = 'images/'
+# Resolution of figures in preview mode, matplotlib saves at 100 dpi by default
+PREVIEW_DPI = 40
+
+
+def draw_histogram(ax, edges, counts, density=False, rwidth=None, **kwargs):
+    """
+    Draw precomputed histogram counts, the equivalent of ax.hist(edges[:-1], bins=edges, weights=counts)
+
+    Parameters
+    ----------
+    ax : matplotlib.axes.Axes
+        axes to draw on
+    edges : array_like
+        edges of the bins, one more than counts
+    counts : array_like
+        number of messages in every bin
+    density : bool
+        normalise the counts so the area of the histogram is 1
+    rwidth : float, optional
+        draw separate bars of this fraction of the bin width, a single filled outline if None
+    kwargs
+        passed on to ax.stairs or ax.bar, e.g. label, color and alpha
+
+    Returns
+    -------
+    matplotlib.artist.Artist
+        the drawn histogram
+    """
+    edges = np.asarray(edges, dtype=np.float64)
+    counts = np.asarray(counts, dtype=np.float64)
+    widths = np.diff(edges)
+    if density and counts.sum():
+        counts = counts / counts.sum() / widths
+    if rwidth is None:
+        return ax.stairs(counts, edges, fill=True, **kwargs)
+    return ax.bar(edges[:-1] + widths * (1 - rwidth) / 2, counts, width=widths * rwidth, align='edge', **kwargs)
+
+
+def save_figure(fig, f_name, preview=False):
+    """
+    Write a figure to FIGURE_FOLDER and free it
+
+    Parameters
+    ----------
+    fig : matplotlib.figure.Figure
+        the figure
+    f_name : str
+        file name of the figure
+    preview : bool
+        save at PREVIEW_DPI instead of the resolution of the figure
+    """
+    from matplotlib import pyplot as plt
+    with stage('savefig') as record:
+        fig.savefig(FIGURE_FOLDER + f_name, dpi=PREVIEW_DPI if preview else 'figure')
+        record['items'] = 1
+    plt.close(fig)
@@ -0,0 +1,650 @@
+#!/usr/bin/env python3
+# Author: Kyle Bringmans
+
+"""
+Columnar on-disk message store built once from the inbox export
+
+The store is a folder with one .npy file per column, memory-mapped when it is opened:
+
+    timestamp_ms.npy    int64, send time of every message
+    sender.npy          int32, index into the sender names of index.json
+    thread.npy          int32, index into the thread (contact folder) names of index.json
+    file.npy            int32, index into the message file names of index.json
+    type.npy            int8, index into MESSAGE_TYPES
+    reactions.npy       int16, number of reactions on the message
+    content_offset.npy  int64, start of the message content in content.bin (one extra trailing entry)
+    thread_offset.npy   int64, first row of every thread (one extra trailing entry)
+
+Rows are sorted by thread and by timestamp within a thread, so the messages of a thread are one contiguous slice.
+manifest.json records the size, modification time, hash, number of messages and participants of every message file so
+the store can be refreshed incrementally when a new export is downloaded.
+"""
+
+from util import iter_message_files, decode_json, get_params_from_config, prefetch, read_file
+from profiling import stage
+
+import contextlib
+import hashlib
+import json
+import os
+import uuid
+
+import numpy as np
+from termcolor import colored
+
+INDEX_FILE = 'index.json'
+MANIFEST_FILE = 'manifest.json'
+CONTENT_FILE = 'content.bin'
+COLUMNS = ('timestamp_ms', 'sender', 'thread', 'file', 'type', 'reactions', 'content_offset', 'thread_offset')
+# Values of the 'type' field of a message, types not listed here are stored as 'Other'
+MESSAGE_TYPES = ('Generic', 'Share', 'Call', 'Subscribe', 'Unsubscribe', 'Payment', 'Plan', 'Other')
+_type_ids = {name: i for i, name in enumerate(MESSAGE_TYPES)}
+
+
+def _parse_message_file(raw, senders, sender_ids):
+    """
+    Decode a single message file into column lists
+
+    Parameters
+    ----------
+    raw : bytes
+        contents of a message_N.json file
+    senders : list
+        names of all known senders, new senders are appended
+    sender_ids : dict
+        sender name -> index into senders, new senders are added
+
+    Returns
+    -------
+    (list, list, list, list, list, list)
+        timestamps, sender ids, type ids, reaction counts and utf-8 encoded contents of every message in the file and
+        the names of the participants of the thread
+    """
+    data = decode_json(raw)
+    timestamps, sender_col, types, reactions, contents = [], [], [], [], []
+    for m in data['messages']:
+        sender = m.get('sender_name', '')
+        if sender not in sender_ids:
+            sender_ids[sender] = len(senders)
+            senders.append(sender)
+        timestamps.append(m['timestamp_ms'])
+        sender_col.append(sender_ids[sender])
+        types.append(_type_ids.get(m.get('type', 'Generic'), len(MESSAGE_TYPES) - 1))
+        reactions.append(len(m.get('reactions', ())))
+        contents.append(m.get('content', '').encode('utf-8'))
+    participants = [participant['name'] for participant in data.get('participants', [])]
+    return timestamps, sender_col, types, reactions, contents, participants
+
+
+def _copy_ranges(blobs, bases, starts, lengths, out_file, chunk_bytes):
+    """
+    Append the byte ranges [start, start + length) to a file, reading at most chunk_bytes at once
+
+    Parameters
+    ----------
+    blobs : list of np.ndarray
+        uint8 arrays, usually memory-mapped, holding the ranges
+    bases : list of int
+        address of the first byte of every blob, starts address the blobs as if they were concatenated
+    starts : np.ndarray
+        start of every range
+    lengths : np.ndarray
+        length of every range
+    out_file : file
+        binary file to append to
+    chunk_bytes : int
+        number of bytes copied at once, at least one range is copied at a time
+    """
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    source = np.searchsorted(bases, starts, side='right') - 1
+    i = 0
+    while i < len(lengths):
+        j = max(int(np.searchsorted(offsets, offsets[i] + chunk_bytes, side='right')) - 1, i + 1)
+        chunk = np.empty(offsets[j] - offsets[i], dtype=np.uint8)
+        for k, blob in enumerate(blobs):
+            rows = i + np.flatnonzero(source[i:j] == k)
+            row_lengths = lengths[rows]
+            # Position of every byte within its range
+            within = np.arange(row_lengths.sum()) - np.repeat(np.cumsum(row_lengths) - row_lengths, row_lengths)
+            chunk[np.repeat(offsets[rows] - offsets[i], row_lengths) + within] = \
+                blob[np.repeat(starts[rows] - bases[k], row_lengths) + within]
+        chunk.tofile(out_file)
+        i = j
+
+
+def _read_spill(path, dtype):
+    # Memory-map a file of raw values written with ndarray.tofile, np.memmap refuses empty files
+    if os.path.getsize(path):
+        return np.memmap(path, dtype=dtype, mode='r')
+    return np.zeros(0, dtype=dtype)
+
+
+def _save(store_path, name, array):
+    # Write next to the old file and swap it in, so open memory maps of the old store stay valid
+    tmp_path = os.path.join(store_path, name + '.tmp.npy')
+    np.save(tmp_path, array)
+    os.replace(tmp_path, os.path.join(store_path, name + '.npy'))
+
+
+def _write_json(store_path, f_name, obj):
+    tmp_path = os.path.join(store_path, f_name + '.tmp')
+    with open(tmp_path, 'w') as json_file:
+        json.dump(obj, json_file)
+    os.replace(tmp_path, os.path.join(store_path, f_name))
+
+
+def open_derived(store, f_name, load, write):
+    """
+    Open a file derived from the store and saved next to it, writing it first if it is missing or out of date
+
+    Derived files such as the count cube record the version of the store they were built from. A new file is written
+    next to the old one and swapped in, so an interrupted build never leaves a broken file behind.
+
+    Parameters
+    ----------
+    store : MessageStore
+        the message store
+    f_name : str
+        name of the file in the store folder
+    load : callable
+        load(path) opens the file, it returns None if the file was built from another version of the store
+    write : callable
+        write(path) builds the file from the store and writes it to path
+
+    Returns
+    -------
+    object
+        the opened file
+    """
+    path = os.path.join(store.path, f_name)
+    if os.path.exists(path):
+        derived = load(path)
+        if derived is not None:
+            return derived
+    root, extension = os.path.splitext(f_name)
+    tmp_path = os.path.join(store.path, root + '.tmp' + extension)
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    write(tmp_path)
+    os.replace(tmp_path, path)
+    return load(path)
+
+
+def _is_complete(store_path):
+    # Stores written before a column was added are missing its file and have to be rebuilt
+    return all(os.path.exists(os.path.join(store_path, f_name))
+               for f_name in (INDEX_FILE,) + tuple(column + '.npy' for column in COLUMNS))
+
+
+def _ingest_folder(job):
+    """
+    Hash and parse the given message files of a single contact folder, runs in a worker process
+
+    Parameters
+    ----------
+    job : (str, str, list)
+        path to the inbox, contact folder name and list of (file name, sha1 recorded in the manifest or None)
+
+    Returns
+    -------
+    (str, list, list)
+        the contact folder name, the sender names local to this folder and for every file a tuple
+        (file name, sha1, columns). columns is None if the hash did not change, otherwise it holds the numpy arrays
+        (timestamps, local sender ids, type ids, reaction counts, content offsets, content bytes) and the list of
+        participants
+    """
+    path_to_folders, p, todo = job
+    senders = []
+    sender_ids = {}
+    results = []
+    # The next files are read on the I/O threads while a file is parsed
+    raws = prefetch(read_file, (path_to_folders + '/' + p + '/' + fn for fn, _ in todo))
+    for (fn, old_sha1), raw in zip(todo, raws):
+        sha1 = hashlib.sha1(raw).hexdigest()
+        if sha1 == old_sha1:
+            results.append((fn, sha1, None))
+            continue
+        timestamps, sender_col, types, reactions, contents, participants = _parse_message_file(raw, senders,
+                                                                                             sender_ids)
+        offsets = np.zeros(len(contents) + 1, dtype=np.int64)
+        np.cumsum([len(c) for c in contents], out=offsets[1:])
+        results.append((fn, sha1, (np.array(timestamps, dtype=np.int64), np.array(sender_col, dtype=np.int32),
+                                   np.array(types, dtype=np.int8), np.array(reactions, dtype=np.int16), offsets,
+                                   np.frombuffer(b''.join(contents), dtype=np.uint8), participants)))
+    return p, senders, results
+
+
+def refresh_store(path_to_folders, store_path, full=False, n_workers=1, memory_limit_mb=None):
+    """
+    Bring the store up to date with the inbox, only parsing message files which were added or changed
+
+    Every message file is recorded in a manifest with its size, modification time, sha1 hash and number of messages. A
+    file whose size and modification time did not change is not read at all, a file which was touched but has the same
+    hash is not parsed. Rows of changed or removed files are dropped and the rows of new or changed files are merged in.
+
+    Parsed messages are spilled to disk as they arrive and the store is written one thread at a time, so only the rows
+    of a single thread are held in memory. With a memory limit the files of large threads are parsed in several batches
+    and message contents are copied in chunks, which keeps the memory use of a build roughly below the limit whatever
+    the size of the inbox.
+
+    Parameters
+    ----------
+    path_to_folders : str
+        path to the inbox folder containing one folder per contact
+    store_path : str
+        folder containing the store, created if it does not exist
+    full : bool
+        ignore the existing store and parse every file
+    n_workers : int
+        number of processes the contact folders are spread over, 0 uses all cores
+    memory_limit_mb : int, optional
+        approximate memory budget of the build in megabytes, unbounded if None
+
+    Returns
+    -------
+    MessageStore
+        the up to date store
+    """
+    previous = None
+    if not full and _is_complete(store_path):
+        previous = MessageStore(store_path)
+    manifest = previous.manifest if previous is not None else {}
+    senders = list(previous.senders) if previous is not None else []
+    sender_ids = {s: i for i, s in enumerate(senders)}
+    n_workers = n_workers or os.cpu_count()
+    # Bytes of JSON parsed per job and bytes of message content copied at once, decoded JSON takes several times the
+    # size of the file in memory
+    limit = memory_limit_mb * 2 ** 20 if memory_limit_mb else None
+    job_bytes = limit // (8 * n_workers) if limit else None
+    chunk_bytes = limit // 32 if limit else np.iinfo(np.int64).max
+
+    # Manifest entries of all files currently in the inbox
+    files = {}
+    # Files whose rows can be reused from the previous store
+    unchanged = []
+    # Files to hash and possibly parse, grouped per contact folder
+    todo = {}
+    with stage('listdir') as record:
+        # Files are stat-ed on the I/O threads, which hides the latency of network file systems
+        stats = prefetch(lambda p_fn: p_fn + (os.stat(path_to_folders + '/' + p_fn[0] + '/' + p_fn[1]),),
+                         iter_message_files(path_to_folders))
+        for p, fn, stat in stats:
+            rel_path = p + '/' + fn
+            entry = manifest.get(rel_path)
+            if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+                files[rel_path] = entry
+                unchanged.append(rel_path)
+                continue
+            files[rel_path] = dict(entry or {}, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            todo.setdefault(p, []).append((fn, entry['sha1'] if entry else None))
+        record['items'] = len(files)
+
+    threads = sorted({rel_path.split('/')[0] for rel_path in files})
+    thread_ids = {p: t for t, p in enumerate(threads)}
+    file_list = sorted(files)
+    file_ids = {rel_path: i for i, rel_path in enumerate(file_list)}
+
+    # The jobs of a folder follow each other, so the parsed rows of a thread are contiguous in the spill files. Folders
+    # larger than the job size are split over several jobs
+    jobs = []
+    for p in todo:
+        batch, batch_bytes = [], 0
+        for fn, sha1 in todo[p]:
+            size = files[p + '/' + fn]['size']
+            if batch and job_bytes and batch_bytes + size > job_bytes:
+                jobs.append((path_to_folders, p, batch))
+                batch, batch_bytes = [], 0
+            batch.append((fn, sha1))
+            batch_bytes += size
+        jobs.append((path_to_folders, p, batch))
+
+    os.makedirs(store_path, exist_ok=True)
+    spill_dtypes = {'timestamp_ms': np.int64, 'sender': np.int32, 'file': np.int32, 'type': np.int8,
+                    'reactions': np.int16, 'content_length': np.int64}
+    spill_paths = {name: os.path.join(store_path, name + '.spill') for name in list(spill_dtypes) + ['content']}
+    # Rows of the spill files holding the new rows of every thread
+    new_rows = {}
+    n_new = 0
+    try:
+        spill = {name: open(path, 'wb') for name, path in spill_paths.items()}
+        pool = None
+        if n_workers > 1 and len(jobs) > 1:
+            from multiprocessing import Pool
+            pool = Pool(min(n_workers, len(jobs)))
+        with stage('parse') as record:
+            record['items'] = 0
+            try:
+                results = pool.imap(_ingest_folder, jobs) if pool is not None else map(_ingest_folder, jobs)
+                for p, folder_senders, folder_results in results:
+                    # Translate the sender ids of the worker to global ids
+                    for sender in folder_senders:
+                        if sender not in sender_ids:
+                            sender_ids[sender] = len(senders)
+                            senders.append(sender)
+                    sender_map = np.array([sender_ids[sender] for sender in folder_senders], dtype=np.int32)
+                    for fn, sha1, parsed in folder_results:
+                        rel_path = p + '/' + fn
+                        files[rel_path]['sha1'] = sha1
+                        if parsed is None:
+                            unchanged.append(rel_path)
+                            continue
+                        print('Ingesting {}'.format(colored(rel_path, 'yellow')))
+                        f_timestamps, f_senders, f_types, f_reactions, f_offsets, f_blob, f_participants = parsed
+                        # Cached message count, read by util.count_messages
+                        files[rel_path]['messages'] = len(f_timestamps)
+                        record['items'] += len(f_timestamps)
+                        files[rel_path]['participants'] = f_participants
+                        f_timestamps.tofile(spill['timestamp_ms'])
+                        sender_map[f_senders].tofile(spill['sender'])
+                        np.full(len(f_timestamps), file_ids[rel_path], dtype=np.int32).tofile(spill['file'])
+                        f_types.tofile(spill['type'])
+                        f_reactions.tofile(spill['reactions'])
+                        np.diff(f_offsets).tofile(spill['content_length'])
+                        f_blob.tofile(spill['content'])
+                        start, _ = new_rows.get(thread_ids[p], (n_new, n_new))
+                        n_new += len(f_timestamps)
+                        new_rows[thread_ids[p]] = (start, n_new)
+            finally:
+                if pool is not None:
+                    pool.close()
+                    pool.join()
+                for spill_file in spill.values():
+                    spill_file.close()
+
+        if previous is not None and len(unchanged) == len(manifest) == len(files):
+            # Nothing to merge, only record new modification times of touched files
+            if files != manifest:
+                _write_json(store_path, MANIFEST_FILE, {'files': files})
+            return previous
+
+        with stage('write') as record:
+            new = {name: _read_spill(spill_paths[name], dtype) for name, dtype in spill_dtypes.items()}
+            new_content = _read_spill(spill_paths['content'], np.uint8)
+            new['content_start'] = np.zeros(len(new['content_length']), dtype=np.int64)
+            np.cumsum(new['content_length'][:-1], out=new['content_start'][1:])
+            # Contents are addressed as if the old and the new contents were concatenated
+            blobs, bases = [new_content], [0]
+            if previous is not None:
+                new['content_start'] += len(previous.content_blob)
+                blobs, bases = [previous.content_blob, new_content], [0, len(previous.content_blob)]
+                # Rows of unchanged files are kept, with their ids translated to the new thread and file lists
+                previous_thread_ids = {p: t for t, p in enumerate(previous.threads)}
+                unchanged = set(unchanged)
+                keep_file = np.array([f in unchanged for f in previous.files], dtype=bool)
+                file_map = np.array([file_ids.get(f, -1) for f in previous.files], dtype=np.int32)
+                old_offsets = previous.content_offset
+
+            # Write the store one thread at a time, sorted by timestamp within the thread
+            dtypes = dict(spill_dtypes, thread=np.int32, content_offset=np.int64)
+            out_paths = {name: os.path.join(store_path, name + '.out') for name in COLUMNS[:-1]}
+            thread_offset = np.zeros(len(threads) + 1, dtype=np.int64)
+            content_size = 0
+            with contextlib.ExitStack() as stack:
+                out = {name: stack.enter_context(open(path, 'wb')) for name, path in out_paths.items()}
+                content_tmp = os.path.join(store_path, CONTENT_FILE + '.tmp')
+                content_file = stack.enter_context(open(content_tmp, 'wb'))
+                for t, p in enumerate(threads):
+                    start, stop = new_rows.get(t, (0, 0))
+                    parts = {name: [new[name][start:stop]] for name in new}
+                    old_t = previous_thread_ids.get(p) if previous is not None else None
+                    if old_t is not None:
+                        rows = np.arange(previous.thread_offset[old_t], previous.thread_offset[old_t + 1])
+                        rows = rows[keep_file[previous.file[rows]]]
+                        parts['timestamp_ms'].append(previous.timestamp_ms[rows])
+                        parts['sender'].append(previous.sender[rows])
+                        parts['file'].append(file_map[previous.file[rows]])
+                        parts['type'].append(previous.type[rows])
+                        parts['reactions'].append(previous.reactions[rows])
+                        parts['content_start'].append(old_offsets[rows])
+                        parts['content_length'].append(old_offsets[rows + 1] - old_offsets[rows])
+                    columns = {name: np.concatenate(part) for name, part in parts.items()}
+                    order = np.argsort(columns['timestamp_ms'], kind='stable')
+                    columns = {name: column[order] for name, column in columns.items()}
+                    columns['thread'] = np.full(len(order), t, dtype=np.int32)
+                    lengths = columns.pop('content_length')
+                    _copy_ranges(blobs, bases, columns.pop('content_start'), lengths, content_file, chunk_bytes)
+                    columns['content_offset'] = content_size + np.cumsum(lengths) - lengths
+                    content_size += int(lengths.sum())
+                    for name in out:
+                        columns[name].tofile(out[name])
+                    thread_offset[t + 1] = thread_offset[t] + len(order)
+                np.array([content_size], dtype=np.int64).tofile(out['content_offset'])
+
+            for name, path in out_paths.items():
+                _save(store_path, name, _read_spill(path, dtypes[name]))
+            _save(store_path, 'thread_offset', thread_offset)
+            os.replace(content_tmp, os.path.join(store_path, CONTENT_FILE))
+            _write_json(store_path, MANIFEST_FILE, {'files': files})
+            # The index is written last so an interrupted build is never mistaken for a complete store
+            _write_json(store_path, INDEX_FILE, {'threads': threads, 'senders': senders, 'files': file_list,
+                                                 'version': uuid.uuid4().hex})
+            record['items'] = int(thread_offset[-1])
+    finally:
+        tmp_paths = [os.path.join(store_path, name + '.out') for name in COLUMNS[:-1]]
+        tmp_paths.append(os.path.join(store_path, CONTENT_FILE + '.tmp'))
+        for path in list(spill_paths.values()) + tmp_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    return MessageStore(store_path)
+
+
+def build_store(path_to_folders, store_path, n_workers=1, memory_limit_mb=None):
+    """
+    Parse every message file of the inbox and write the columnar store
+
+    Parameters
+    ----------
+    path_to_folders : str
+        path to the inbox folder containing one folder per contact
+    store_path : str
+        folder to write the store to, created if it does not exist
+    n_workers : int
+        number of processes the contact folders are spread over, 0 uses all cores
+    memory_limit_mb : int, optional
+        approximate memory budget of the build in megabytes, unbounded if None
+
+    Returns
+    -------
+    MessageStore
+        the freshly written store
+    """
+    return refresh_store(path_to_folders, store_path, full=True, n_workers=n_workers, memory_limit_mb=memory_limit_mb)
+
+
+def open_store(path_to_folders, store_path, n_workers=1, memory_limit_mb=None):
+    """
+    Open the store at store_path, building it from the inbox first if it does not exist yet
+
+    Parameters
+    ----------
+    path_to_folders : str
+        path to the inbox folder containing one folder per contact
+    store_path : str
+        folder containing the store
+    n_workers : int
+        number of processes used when the store has to be built, 0 uses all cores
+    memory_limit_mb : int, optional
+        approximate memory budget when the store has to be built, unbounded if None
+
+    Returns
+    -------
+    MessageStore
+        the opened store
+    """
+    if not _is_complete(store_path):
+        print("Building message store in '{}'".format(colored(store_path, 'cyan')))
+        return build_store(path_to_folders, store_path, n_workers, memory_limit_mb)
+    return MessageStore(store_path)
+
+
+class MessageStore:
+    """
+    Read-only view on a columnar message store, all columns are memory-mapped from disk
+    """
+
+    def __init__(self, store_path):
+        self.path = store_path
+        with open(os.path.join(store_path, INDEX_FILE)) as index_file:
+            index = json.load(index_file)
+        # Folder name of every thread and name of every sender
+        self.threads = index['threads']
+        self.senders = index['senders']
+        # Path of every message file relative to the inbox
+        self.files = index['files']
+        # Changes every time the store is rewritten, aggregates built from the store record it
+        self.version = index.get('version')
+        with open(os.path.join(store_path, MANIFEST_FILE)) as manifest_file:
+            self.manifest = json.load(manifest_file)['files']
+        for column in COLUMNS:
+            setattr(self, column, np.load(os.path.join(store_path, column + '.npy'), mmap_mode='r'))
+        content_path = os.path.join(store_path, CONTENT_FILE)
+        if os.path.getsize(content_path):
+            self.content_blob = np.memmap(content_path, dtype=np.uint8, mode='r')
+        else:
+            self.content_blob = np.zeros(0, dtype=np.uint8)
+        self._identity = None
+
+    @property
+    def identity(self):
+        """
+        Contact ids and display names of the store, see identity.IdentityTable
+        """
+        if self._identity is None:
+            from identity import open_identity_table
+            self._identity = open_identity_table(self)
+        return self._identity
+
+    def __len__(self):
+        return len(self.timestamp_ms)
+
+    def thread_counts(self):
+        """
+        Number of messages in every thread
+
+        Returns
+        -------
+        np.ndarray
+            int64 array with one count per thread
+        """
+        return np.diff(self.thread_offset)
+
+    def top_threads(self, n):
+        """
+        Threads with the most messages, most messages first
+
+        Parameters
+        ----------
+        n : int
+            number of threads to return
+
+        Returns
+        -------
+        np.ndarray
+            thread ids
+        """
+        return np.argsort(-self.thread_counts(), kind='stable')[:n]
+
+    def thread_rows(self, t):
+        """
+        Row slice holding all messages of thread t
+        """
+        return slice(int(self.thread_offset[t]), int(self.thread_offset[t + 1]))
+
+    def timestamps(self, t):
+        """
+        Sorted send times of all messages in thread t
+        """
+        return self.timestamp_ms[self.thread_rows(t)]
+
+    def content(self, i):
+        """
+        Text content of message i
+        """
+        return bytes(self.content_blob[self.content_offset[i]:self.content_offset[i + 1]]).decode('utf-8')
+
+    def contact_name(self, t, clean=True):
+        """
+        Name of the contact of thread t
+
+        Parameters
+        ----------
+        t : int
+            thread id
+        clean : bool
+            strip the folder suffix and add a space between name and surname
+
+        Returns
+        -------
+        str
+            the contact name
+        """
+        if clean:
+            return self.identity.contact_name(t)
+        return self.threads[t]
+
+    def contact_ids(self, clean_names=True):
+        """
+        Number the contacts, threads which share a contact name get the same id
+
+        Parameters
+        ----------
+        clean_names : bool
+            identify contacts by cleaned contact name instead of folder name
+
+        Returns
+        -------
+        (list, np.ndarray)
+            contact names in order of first appearance and the contact id of every thread
+        """
+        if clean_names:
+            return list(self.identity.contacts), self.identity.thread_contact.copy()
+        # Folder names are unique, every thread is its own contact
+        return list(self.threads), np.arange(len(self.threads), dtype=np.int64)
+
+    def participants(self):
+        """
+        Participants of every thread, as listed in its message files
+
+        Returns
+        -------
+        list
+            sorted participant names of every thread
+        """
+        from identity import fix_encoding
+        participants = [set() for _ in self.threads]
+        thread_ids = {p: t for t, p in enumerate(self.threads)}
+        for rel_path, entry in self.manifest.items():
+            participants[thread_ids[rel_path.split('/')[0]]].update(map(fix_encoding, entry.get('participants', [])))
+        return [sorted(names) for names in participants]
+
+
+if __name__ == '__main__':
+    from cube import open_cube
+    from groups import open_group_table
+    from identity import open_identity_table
+
+    path_to_config = 'config.yaml'
+    args = get_params_from_config(path_to_config)
+
+    FOLDERS_PATH = args['messages_folder']
+    STORE_PATH = args['store_folder']
+    N_WORKERS = args['n_workers']
+    MEMORY_LIMIT_MB = args['memory_limit_mb']
+    USERNAME = args['username']
+
+    print("Refreshing message store in '{}'".format(colored(STORE_PATH, 'cyan')))
+    store = refresh_store(FOLDERS_PATH, STORE_PATH, n_workers=N_WORKERS, memory_limit_mb=MEMORY_LIMIT_MB)
+    print("Stored {} messages from {} threads".format(colored(len(store), 'red'), colored(len(store.threads), 'red')))
+    # Aggregate the store into the count cube the reports are answered from
+    cube = open_cube(store, USERNAME, MEMORY_LIMIT_MB)
+    print("Count cube has {} cells".format(colored(len(cube), 'red')))
+    # Count the messages of every member of every group chat
+    groups = open_group_table(store, MEMORY_LIMIT_MB)
+    print("Found {} group chats".format(colored(len(groups.groups), 'red')))
+    # Number the contacts and repair the names of the senders
+    identity = open_identity_table(store)
+    print("Found {} contacts".format(colored(len(identity.contacts), 'red')))
+
+    print("Done")
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# Author: Kyle Bringmans
+
+"""
+Writes a deterministic synthetic inbox in the Facebook export format, used to benchmark the scripts without a real
+export
+"""
+
+import argparse
+from datetime import datetime, timezone
+import json
+import os
+import random
+
+FIRST_NAMES = ['Anna', 'Bram', 'Chloe', 'Daan', 'Emma', 'Finn', 'Hanne', 'Jonas', 'Lotte', 'Milan', 'Nina', 'Ruben',
+               'Sofie', 'Thomas', 'Lien', 'Wout']
+LAST_NAMES = ['Peeters', 'Janssens', 'Maes', 'Jacobs', 'Mertens', 'Willems', 'Claes', 'Goossens', 'Wouters', 'Dubois']
+WORDS = ['hey', 'ok', 'see', 'you', 'tomorrow', 'haha', 'thanks', 'where', 'are', 'what', 'time', 'yes', 'no']
+GROUP_WORDS = ['weekend', 'team', 'family', 'trip', 'party', 'study', 'kot', 'band']
+# Reactions as exports write them, utf-8 encoded emoji decoded as latin-1
+REACTIONS = ['\u00f0\u009f\u0098\u0086', '\u00e2\u009d\u00a4']
+
+# 01/01/2010 and 20/08/2020 in milliseconds
+START_MS = 1262304000000
+END_MS = 1597881600000
+
+
+def _date_ms(date):
+    # Milliseconds since 01/01/1970 (UTC) of a YYYY-MM-DD date
+    return int(datetime.strptime(date, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def write_inbox(path, n_contacts, messages_per_contact, shard_size=10000, username='Kyle Bringmans', seed=0,
+                group_ratio=0.0, start_ms=START_MS, end_ms=END_MS):
+    """
+    Write a synthetic inbox with one folder per contact
+
+    Parameters
+    ----------
+    path : str
+        inbox folder to write to, created if it does not exist
+    n_contacts : int
+        number of contact folders, including group chats
+    messages_per_contact : int
+        average number of messages per contact, the actual number is drawn around it
+    shard_size : int
+        maximum number of messages per message_N.json file
+    username : str
+        name of the owner of the inbox
+    seed : int
+        seed of the random generator, the same seed always writes the same inbox
+    group_ratio : float
+        fraction of the contact folders which are group chats of 3 to 8 people
+    start_ms : int
+        earliest send time of a message in milliseconds
+    end_ms : int
+        latest send time of a message in milliseconds
+
+    Returns
+    -------
+    int
+        total number of messages written
+    """
+    rng = random.Random(seed)
+    total = 0
+    for i in range(n_contacts):
+        if rng.random() < group_ratio:
+            # Group chat of the user and 2 to 7 other people
+            title = '{} {}'.format(rng.choice(GROUP_WORDS), rng.choice(GROUP_WORDS))
+            members = ['{} {}'.format(rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES))
+                       for _ in range(rng.randint(2, 7))]
+            folder = title.replace(' ', '')
+            thread_type = 'RegularGroup'
+        else:
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            title = '{} {}'.format(first, last)
+            members = [title]
+            folder = first + last
+            thread_type = 'Regular'
+        p_path = os.path.join(path, '{}_{:010x}'.format(folder, rng.getrandbits(40)))
+        os.makedirs(p_path, exist_ok=True)
+        n_messages = max(1, int(rng.expovariate(1 / messages_per_contact)))
+        senders = [username] + members
+        messages = []
+        for _ in range(n_messages):
+            message = {'sender_name': rng.choice(senders),
+                       'timestamp_ms': rng.randint(start_ms, end_ms),
+                       'content': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 12))),
+                       'type': 'Generic'}
+            if rng.random() < 0.05:
+                message['reactions'] = [{'reaction': rng.choice(REACTIONS), 'actor': rng.choice(senders)}]
+            messages.append(message)
+        # Exports list the newest messages first
+        messages.sort(key=lambda m: m['timestamp_ms'], reverse=True)
+        participants = [{'name': name} for name in members + [username]]
+        for n, start in enumerate(range(0, n_messages, shard_size)):
+            with open(os.path.join(p_path, 'message_{}.json'.format(n + 1)), 'w') as json_file:
+                json.dump({'participants': participants, 'messages': messages[start:start + shard_size],
+                           'title': title, 'thread_type': thread_type}, json_file)
+        total += n_messages
+    return total
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('path', help='inbox folder to write to')
+    parser.add_argument('--contacts', type=int, default=100)
+    parser.add_argument('--messages', type=int, default=1000, help='average number of messages per contact')
+    parser.add_argument('--shard-size', type=int, default=10000, help='maximum number of messages per file')
+    parser.add_argument('--group-ratio', type=float, default=0.0, help='fraction of the folders which are group chats')
+    parser.add_argument('--start', default='2010-01-01', help='earliest date of a message, YYYY-MM-DD')
+    parser.add_argument('--end', default='2020-08-20', help='latest date of a message, YYYY-MM-DD')
+    parser.add_argument('--seed', type=int, default=0)
+    parsed = parser.parse_args()
+
+    total = write_inbox(parsed.path, parsed.contacts, parsed.messages, parsed.shard_size, seed=parsed.seed,
+                        group_ratio=parsed.group_ratio, start_ms=_date_ms(parsed.start), end_ms=_date_ms(parsed.end))
+    print("Wrote {} messages to '{}'".format(total, parsed.path))
@@ -0,0 +1,87 @@
+# Author: Kyle Bringmans
+
+"""
+Checks that refreshing the message store after the inbox changed gives the same store as building it from scratch
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from store import build_store, refresh_store, MessageStore, COLUMNS
+from synthetic_inbox import write_inbox
+
+import contextlib
+import io
+import json
+import shutil
+
+import numpy as np
+import pytest
+
+
+def assert_same_store(store, expected):
+    # Row for row equality of two stores, including the manifest apart from modification times
+    assert store.threads == expected.threads
+    assert store.files == expected.files
+    for column in COLUMNS:
+        assert getattr(store, column).dtype == getattr(expected, column).dtype, column
+        if column != 'sender':
+            assert np.array_equal(getattr(store, column), getattr(expected, column)), column
+    # A refresh keeps the ids of known senders and numbers new ones after them, compare the names instead of the ids
+    assert set(expected.senders) <= set(store.senders)
+    assert np.array_equal(np.array(store.senders)[store.sender], np.array(expected.senders)[expected.sender])
+    assert np.array_equal(store.content_blob, expected.content_blob)
+
+    def without_mtime(manifest):
+        return {f: {key: value for key, value in entry.items() if key != 'mtime_ns'} for f, entry in manifest.items()}
+    assert without_mtime(store.manifest) == without_mtime(expected.manifest)
+
+
+@pytest.mark.parametrize('n_workers, memory_limit_mb', [(1, None), (2, None), (1, 1)])
+def test_refresh_matches_full_build(tmp_path, n_workers, memory_limit_mb):
+    inbox = str(tmp_path / 'inbox')
+    write_inbox(inbox, n_contacts=12, messages_per_contact=150, shard_size=50, seed=1, group_ratio=0.25)
+    store_path = str(tmp_path / 'store')
+    with contextlib.redirect_stdout(io.StringIO()):
+        build_store(inbox, store_path, n_workers, memory_limit_mb)
+    before = MessageStore(store_path)
+
+    folders = sorted(os.listdir(inbox))
+    sharded = [f for f in folders if os.path.exists(os.path.join(inbox, f, 'message_2.json'))]
+    assert len(sharded) >= 3
+
+    # Change a file: keep every other message
+    changed = os.path.join(inbox, sharded[0], 'message_1.json')
+    with open(changed) as f:
+        data = json.load(f)
+    data['messages'] = data['messages'][::2]
+    with open(changed, 'w') as f:
+        json.dump(data, f)
+    # Remove a file
+    os.remove(os.path.join(inbox, sharded[1], 'message_2.json'))
+    # Add a contact folder
+    shutil.copytree(os.path.join(inbox, folders[-1]), os.path.join(inbox, 'ZoeNew_00000000ff'))
+    # Touch a file without changing it
+    os.utime(os.path.join(inbox, sharded[2], 'message_1.json'))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        refresh_store(inbox, store_path, n_workers=n_workers, memory_limit_mb=memory_limit_mb)
+        build_store(inbox, str(tmp_path / 'full'), n_workers, memory_limit_mb)
+    refreshed = MessageStore(store_path)
+    full = MessageStore(str(tmp_path / 'full'))
+
+    assert refreshed.version != before.version
+    assert len(refreshed) != len(before)
+    assert_same_store(refreshed, full)
+
+
+def test_refresh_without_changes_keeps_store(tmp_path):
+    inbox = str(tmp_path / 'inbox')
+    write_inbox(inbox, n_contacts=5, messages_per_contact=80, shard_size=50, seed=2)
+    store_path = str(tmp_path / 'store')
+    with contextlib.redirect_stdout(io.StringIO()):
+        build_store(inbox, store_path)
+        before = MessageStore(store_path)
+        refresh_store(inbox, store_path)
+    assert_same_store(MessageStore(store_path), before)
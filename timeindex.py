@@ -0,0 +1,114 @@
+# Author: Kyle Bringmans
+
+"""
+Sorted per-contact timestamp index answering "how many messages in [start, stop)" with binary search
+"""
+
+import numpy as np
+
+
+class TimestampIndex:
+    """
+    Timestamps of all messages sorted by contact and time
+
+    The timestamps of all contacts are a single array, sorted by contact and by time within a contact, which is the row
+    order of the message store. The timestamps of every contact are binary searched in place, so a memory-mapped column
+    is never copied and only the pages touched by the search are read.
+    """
+
+    def __init__(self, timestamp_ms, offsets, contacts=None):
+        """
+        Parameters
+        ----------
+        timestamp_ms : array_like
+            unix timestamps in milliseconds of the messages, sorted by contact and time, e.g. store.timestamp_ms
+        offsets : array_like
+            first message of every contact with one extra trailing entry, e.g. store.thread_offset
+        contacts : array_like, optional
+            contacts to count, all contacts if None. Rows of the results follow this order
+        """
+        self.timestamp_ms = timestamp_ms
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.contacts = np.arange(len(self.offsets) - 1) if contacts is None else np.asarray(contacts, dtype=np.int64)
+        self.n_contacts = len(self.contacts)
+
+    def _messages_before(self, timestamps):
+        # Number of messages of every contact before every timestamp, differences give window counts. Timestamps are
+        # integers, so rounding fractional queries up counts the same messages while the search stays in int64 and
+        # never converts the column
+        queries = np.asarray(timestamps)
+        if not np.issubdtype(queries.dtype, np.integer):
+            queries = np.ceil(queries)
+        queries = queries.astype(np.int64)
+        before = np.zeros((self.n_contacts, len(queries)), dtype=np.int64)
+        for i, c in enumerate(self.contacts):
+            before[i] = np.searchsorted(self.timestamp_ms[self.offsets[c]:self.offsets[c + 1]], queries, side='left')
+        return before
+
+    def count_in(self, starts, stops):
+        """
+        Count the messages of every contact in the windows [starts[i], stops[i])
+
+        Parameters
+        ----------
+        starts : array_like
+            start of every window in milliseconds (inclusive)
+        stops : array_like
+            end of every window in milliseconds (exclusive)
+
+        Returns
+        -------
+        np.ndarray
+            (n_contacts, number of windows) array of message counts
+        """
+        return self._messages_before(stops) - self._messages_before(starts)
+
+    def count_between(self, start, stop):
+        """
+        Count the messages of every contact in [start, stop)
+
+        Returns
+        -------
+        np.ndarray
+            number of messages per contact
+        """
+        return self.count_in([start], [stop])[:, 0]
+
+    def window_counts(self, edges):
+        """
+        Count the messages of every contact between consecutive edges
+
+        Parameters
+        ----------
+        edges : array_like
+            sorted window edges in milliseconds
+
+        Returns
+        -------
+        np.ndarray
+            (n_contacts, len(edges) - 1) array of message counts
+        """
+        return np.diff(self._messages_before(edges), axis=1)
+
+    def rolling_counts(self, start, stop, width, step=None):
+        """
+        Count the messages of every contact in rolling windows
+
+        Parameters
+        ----------
+        start : int
+            start of the first window in milliseconds
+        stop : int
+            no window starts at or after stop
+        width : int
+            length of every window in milliseconds, e.g. 30 * buckets.MS_PER_DAY for months
+        step : int, optional
+            distance between the starts of consecutive windows, defaults to width (non-overlapping windows)
+
+        Returns
+        -------
+        (np.ndarray, np.ndarray)
+            the start of every window and a (n_contacts, number of windows) array of message counts
+        """
+        starts = np.arange(int(start), int(stop), int(step or width), dtype=np.int64)
+        return starts, self.count_in(starts, starts + int(width))
@@ -5,51 +5,77 @@
 Plots the top-N contacts the user interacts with on Facebook in a pie chart
 """
 
-from util import get_messages, get_params_from_config
+from util import get_params_from_config
+from store import open_store
+from cube import open_cube, group_threads
+from render import save_figure
+from profiling import stage
+from database import open_database
+from topk import top_k
 
 from matplotlib import pyplot as plt
 
-if __name__ == '__main__':
-    path_to_config = 'config.yaml'
-    args = get_params_from_config(path_to_config)
 
+def main(args, store, cube):
+    """
+    Plot the top-N contacts in a pie chart
+
+    Parameters
+    ----------
+    args : dict
+        parameters read from the config file
+    store : MessageStore
+        the message store
+    cube : CountCube
+        message counts of the store
+    """
     # Number of contacts to find
     N = args['n']
     # Filename for plot
     F_NAME = args['f_name']
-    FOLDERS_PATH = args['messages_folder']
-
-    # Count number of interactions
-    interactions = get_messages(FOLDERS_PATH, interactions=True)
 
-    # Sort contacts by interactions
-    sorted_interactions = sorted(interactions.items(), reverse=True, key=lambda a: a[1])
+    if args.get('backend') == 'sqlite':
+        # Count the interactions and select the N contacts with the most in a single query
+        x, y = zip(*open_database(store).contact_counts(N))
+    else:
+        # Count number of interactions, threads with the same contact name are counted together
+        names, thread_contact = store.contact_ids()
+        interactions = group_threads(store.thread_counts(), thread_contact, len(names))
 
-    # Prepare the N contacts for plotting
-    x, y = zip(*sorted_interactions[:N])
+        # Select the N contacts with the most interactions
+        top = top_k(interactions, N)
+        x, y = [names[c] for c in top], tuple(int(nr) for nr in interactions[top])
 
     # Create labels
     labels = [xi + '\n' + '(' + str(yi) + ')' for (xi, yi) in zip(x, y)]
 
     # Create 'others' class
-    _, y_rest = zip(*sorted_interactions[N:])
-    s = sum(y_rest)
+    s = len(store) - sum(y)
     y = y + (s,)
     labels.append('others' + '\n' + '(' + str(s) + ')')
 
-    # Plot data
-    fig, ax = plt.subplots(1, 1)
-    plt.pie(y, labels=labels, autopct='%1.1f%%')
+    with stage('plot'):
+        # Plot data
+        fig, ax = plt.subplots(1, 1)
+        plt.pie(y, labels=labels, autopct='%1.1f%%')
 
-    # Add grid
-    plt.grid(True)
-    # Move grid to back of figure
-    ax.set_axisbelow(True)
-    # Set title
-    plt.title("Top {} most messaged contacts".format(N))
+        # Add grid
+        plt.grid(True)
+        # Move grid to back of figure
+        ax.set_axisbelow(True)
+        # Set title
+        plt.title("Top {} most messaged contacts".format(N))
 
     # Save figure
     print("Writing figure to '{}'".format(F_NAME))
-    plt.savefig('images/' + F_NAME)
+    save_figure(fig, F_NAME, args['preview'])
 
     print("Done")
+
+
+if __name__ == '__main__':
+    path_to_config = 'config.yaml'
+    args = get_params_from_config(path_to_config)
+
+    store = open_store(args['messages_folder'], args['store_folder'], args['n_workers'], args['memory_limit_mb'])
+    main(args, store, open_cube(store, args['username'], args['memory_limit_mb']))
@@ -4,102 +4,130 @@
 """
 Plots the top-N contacts the user interacts with on Facebook in a pie chart
 """
-from util import get_messages, get_params_from_config
-
-from datetime import datetime
+from util import get_params_from_config
+from store import open_store
+from cube import open_cube, group_threads
+from render import save_figure
+from profiling import stage
+from database import open_database
+from topk import top_k, rank_trajectory
 
 from matplotlib import pyplot as plt
+import numpy as np
 
-if __name__ == '__main__':
-    path_to_config = 'config.yaml'
-    args = get_params_from_config(path_to_config)
 
+def period_name(label, period):
+    """
+    Readable name of a period
+
+    Parameters
+    ----------
+    label : int
+        the period, numbered like buckets.bucket_timestamps
+    period : str
+        'year', 'quarter' or 'month'
+
+    Returns
+    -------
+    str
+        e.g. '2020', '2020-Q3' or '2020-07'
+    """
+    if period == 'quarter':
+        return '{}-Q{}'.format(1970 + label // 4, label % 4 + 1)
+    if period == 'month':
+        return str(np.datetime64(int(label), 'M'))
+    return str(label)
+
+
+def main(args, store, cube):
+    """
+    Plot the top-N contacts of every year, quarter or month
+
+    Parameters
+    ----------
+    args : dict
+        parameters read from the config file
+    store : MessageStore
+        the message store
+    cube : CountCube
+        message counts of the store
+    """
     # Number of contacts to find
     N = args['n']
     # Filename for plot
     F_NAME = args['f_name']
-    FOLDERS_PATH = args['messages_folder']
-
-    messages = get_messages(FOLDERS_PATH)
-
-    # Get the year number for each message of each person
-    for p, mgs in messages.items():
-        # Get year
-        mgs = [int(datetime.utcfromtimestamp(m['timestamp_ms'] / 1000).strftime('%Y')) for m in mgs]
-        # Overwrite messages with years
-        messages[p] = mgs
-
-    # For each year get the contacts sorted by amount of messages
-    yrs = list(range(2010, 2021))
-    # Top contacts for each year
-    top_for_yrs = []
-    for yr in yrs:
-        # Top contacts for a single year
-        top_for_yr = []
-        # Get the messages for each person
-        for p, mgs in messages.items():
-            # Keep the name and amount of messages for later color calculation
-            top_for_yr.append([p, mgs.count(yr)])
-        # Sort them in reverse
-        top_for_yr = sorted(top_for_yr, reverse=True, key=lambda a: a[1])
-        # Add them to the total list
-        top_for_yrs.append([yr, top_for_yr])
-
-    # Create subplots
-    fig, ax = plt.subplots(len(yrs), 1, figsize=(20, 30))
-    for i, (yr, top_n) in enumerate(top_for_yrs):
-        # Unzip the list of all the contacts for a single year
-        ppl, mgs = zip(*top_n)
-        ppl = list(ppl)
-        # Calculate the colours of the histogram
-        colors = []
-        if i != 0:
-            for p, _ in top_n:
-                # Get the top contacts for the previous year
-                _, l_ppl = top_for_yrs[i - 1]
-                # Unzip the contact list of last year and get only the names
-                l_ppl, _ = zip(*l_ppl)
-                try:
-                    # Get the index of the person for last year
-                    prev_index = l_ppl.index(p)
-                except ValueError:
-                    # If the contact was not befriended with you the year before, assume the amount of messages
-                    # has increased and assign the green colour (-1 is smaller than any natural number)
-                    prev_index = -1
-                # Red if the interactions have decreased (higher index, more to the right in the plot)
-                if prev_index < ppl.index(p):
-                    colors.append('red')
-                # Yellow if the interactions have stayed the same
-                elif prev_index == ppl.index(p):
-                    colors.append('yellow')
-                # Green if the interactions have increased (lower index, more to the left in the plot)
-                else:
-                    colors.append('green')
-        # Set colour of the first year to blue
-        if not colors:
-            colors = 'blue'
-        # Remove entries if they have 0 messages because this will not provide useful data
-        for j, mg in enumerate(mgs):
-            if mg == 0:
-                ppl[j] = ''
-        # Create bar plot for a given year with the provided colours
-        ax[i].bar(ppl[:N], mgs[:N], color=colors, alpha=0.8)
-        # Set y-axis title
-        ax[i].set_ylabel('# messages')
-        # Show grid
-        ax[i].grid(True)
-        # Place grid behind other graph elements
-        ax[i].set_axisbelow(True)
-        # Show the legend
-        colors = {'higher compared to prev year': 'green', 'Same compared to prev year': 'yellow',
-                  'Lower compared to prev year': 'red', }
-        labels = list(colors.keys())
-        handles = [plt.Rectangle((0, 0), 1, 1, color=colors[label]) for label in labels]
-        ax[i].legend(handles, labels)
-        # Rotate x-axis labels 90 degrees to make them readable
-        plt.setp(ax[i].get_xticklabels(), rotation=5, horizontalalignment='right')
-        # Set the title for the subplot to the year for which the data is shown
-        ax[i].set_title(yr)
-    # Resize the image to the correct resolution so all items are shown
-    plt.tight_layout()
-    plt.savefig('images/' + F_NAME)
+
+    # First and last year to show and the length of a period: 'year', 'quarter' or 'month'
+    START_YEAR = args['evolution_start']
+    END_YEAR = args['evolution_end']
+    PERIOD = args['evolution_period']
+
+    # Count the messages of every contact in every period, threads with the same contact name are counted together
+    start = np.datetime64(str(START_YEAR), 'ms').astype(np.int64)
+    stop = np.datetime64(str(END_YEAR + 1), 'ms').astype(np.int64)
+    if args.get('backend') == 'sqlite':
+        database = open_database(store)
+        names = database.contact_names()
+        periods, counts = database.contact_period_counts(PERIOD, start, stop)
+    else:
+        names, thread_contact = store.contact_ids()
+        labels, counts = cube.rollup(('thread', PERIOD), start=start, stop=stop)
+        periods = labels[PERIOD]
+        counts = group_threads(counts, thread_contact, len(names))
+
+    # Rank of every contact in every period and the top N contacts of every period, most messages first
+    ranks = rank_trajectory(counts)
+    top_for_periods = top_k(counts, N, axis=0)
+    # Red if the interactions have decreased (higher index, more to the right in the plot), yellow if they have stayed
+    # the same and green if they have increased (lower index, more to the left in the plot)
+    prev_ranks = np.take_along_axis(ranks[:, :-1], top_for_periods[:, 1:], axis=0)
+    rank_colors = np.select([prev_ranks < np.arange(len(top_for_periods))[:, None],
+                             prev_ranks == np.arange(len(top_for_periods))[:, None]], ['red', 'yellow'], 'green')
+
+    with stage('plot'):
+        # Create subplots
+        fig, ax = plt.subplots(len(periods), 1, figsize=(20, 30 * len(periods) / 11), squeeze=False)
+        ax = ax[:, 0]
+        for i, period in enumerate(periods):
+            top_n = top_for_periods[:, i]
+            ppl = [names[c] for c in top_n]
+            mgs = [int(nr) for nr in counts[top_n, i]]
+            # Calculate the colours of the histogram
+            colors = list(rank_colors[:, i - 1]) if i != 0 else []
+            # Set colour of the first year to blue
+            if not colors:
+                colors = 'blue'
+            # Remove entries if they have 0 messages because this will not provide useful data
+            for j, mg in enumerate(mgs):
+                if mg == 0:
+                    ppl[j] = ''
+            # Create bar plot for a given year with the provided colours
+            ax[i].bar(ppl[:N], mgs[:N], color=colors, alpha=0.8)
+            # Set y-axis title
+            ax[i].set_ylabel('# messages')
+            # Show grid
+            ax[i].grid(True)
+            # Place grid behind other graph elements
+            ax[i].set_axisbelow(True)
+            # Show the legend
+            colors = {'higher compared to prev {}'.format(PERIOD): 'green',
+                      'Same compared to prev {}'.format(PERIOD): 'yellow',
+                      'Lower compared to prev {}'.format(PERIOD): 'red', }
+            labels = list(colors.keys())
+            handles = [plt.Rectangle((0, 0), 1, 1, color=colors[label]) for label in labels]
+            ax[i].legend(handles, labels)
+            # Rotate x-axis labels 90 degrees to make them readable
+            plt.setp(ax[i].get_xticklabels(), rotation=5, horizontalalignment='right')
+            # Set the title for the subplot to the period for which the data is shown
+            ax[i].set_title(period_name(period, PERIOD))
+        # Resize the image to the correct resolution so all items are shown
+        plt.tight_layout()
+    save_figure(fig, F_NAME, args['preview'])
+
+
+if __name__ == '__main__':
+    path_to_config = 'config.yaml'
+    args = get_params_from_config(path_to_config)
+
+    store = open_store(args['messages_folder'], args['store_folder'], args['n_workers'], args['memory_limit_mb'])
+    main(args, store, open_cube(store, args['username'], args['memory_limit_mb']))
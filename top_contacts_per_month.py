@@ -5,26 +5,37 @@
 Show the most contacted person per month
 """
 
-from util import get_messages, get_params_from_config
-
+from util import get_params_from_config
+from store import open_store
+from cube import open_cube, group_threads
+from database import open_database
+from topk import StreamingTopK
+from timeindex import TimestampIndex
+from buckets import MS_PER_DAY
 
 from datetime import datetime
 import time
 
-from pandas.plotting import register_matplotlib_converters
+import numpy as np
 
-if __name__ == '__main__':
-    path_to_config = 'config.yaml'
-    args = get_params_from_config(path_to_config)
 
-    # Allow usage of pandas arrays in matplotlib
-    register_matplotlib_converters()
+def main(args, store, cube):
+    """
+    Print the most contacted person of every month
 
+    Parameters
+    ----------
+    args : dict
+        parameters read from the config file
+    store : MessageStore
+        the message store
+    cube : CountCube
+        message counts of the store
+    """
     # Assign arguments to variables
     F_NAME = args['f_name']
     N = args['n']
     USERNAME = args['username']
-    FOLDERS_PATH = args['messages_folder']
 
     # Start and end date
     START = '01/10/2019'
@@ -37,27 +48,44 @@ if __name__ == '__main__':
     min_date = time.mktime(datetime.strptime(START, "%d/%m/%Y").timetuple()) * MS_OFFSET_FACTOR
     max_date = time.mktime(datetime.strptime(END, "%d/%m/%Y").timetuple()) * MS_OFFSET_FACTOR
 
-    # Get messages from files
-    messages = get_messages(FOLDERS_PATH)
-
-    # Map messages to send times
-    for p in messages:
-        msg = [m['timestamp_ms'] for m in messages[p]]
-        messages[p] = msg
+    # Length of a window and distance between the starts of consecutive windows, 30 days
+    WINDOW = 30 * MS_PER_DAY
+    STEP = WINDOW
 
     top_contacts = []
-    while min_date < max_date:
-        nxt_date = min_date + 2592000000
-        interactions = {}
-        for p, msg in messages.items():
-            msg_slice = list(filter(lambda x: min_date <= x < nxt_date, msg))
-            interactions[p] = len(msg_slice)
-        sorted_interactions = sorted(interactions.items(), reverse=True, key=lambda x: x[1])
-        top_contact = sorted_interactions[0]
-        top_contacts.append(((min_date, nxt_date), top_contact))
-        min_date = nxt_date
+    if args.get('backend') == 'sqlite':
+        # Group the messages by window and contact and keep the top contact of every window in a single query
+        for start, name, count in open_database(store).top_contact_per_window(min_date, max_date, WINDOW):
+            top_contacts.append(((start, start + WINDOW), (name, count)))
+    else:
+        # Threads with the same contact name are counted together
+        names, thread_contact = store.contact_ids()
+
+        # Count the messages of every contact in every window at once from the exact timestamps, the windows start at
+        # local midnight which is not on a whole hour in every time zone
+        index = TimestampIndex(store.timestamp_ms, store.thread_offset)
+        starts, counts = index.rolling_counts(min_date, max_date, WINDOW, STEP)
+        counts = group_threads(counts, thread_contact, len(names))
+
+        # Slide over the windows, only the counts which changed since the previous window are re-ranked
+        ranking = StreamingTopK(len(names))
+        for i, start in enumerate(starts):
+            deltas = counts[:, i] - ranking.counts
+            changed = np.flatnonzero(deltas)
+            ranking.update(changed, deltas[changed])
+            # First contact with the most messages in the window
+            (top, count), = ranking.top(1)
+            top_contacts.append(((start, start + WINDOW), (names[top], count)))
 
     for (start, end), contact in top_contacts:
         start = datetime.utcfromtimestamp(start/MS_OFFSET_FACTOR).strftime('%Y-%m')
         end = datetime.utcfromtimestamp(end/MS_OFFSET_FACTOR).strftime('%Y-%m')
         print("Top contact for ({} - {}) is: {}, with {} messages".format(start, end, contact[0], contact[1]))
+
+
+if __name__ == '__main__':
+    path_to_config = 'config.yaml'
+    args = get_params_from_config(path_to_config)
+
+    store = open_store(args['messages_folder'], args['store_folder'], args['n_workers'], args['memory_limit_mb'])
+    main(args, store, open_cube(store, args['username'], args['memory_limit_mb']))
@@ -0,0 +1,128 @@
+# Author: Kyle Bringmans
+
+"""
+Top-K selection over count arrays without sorting every contact
+
+Ties are broken by the lowest id, which gives the same order as a stable sort by descending count.
+"""
+
+import heapq
+
+import numpy as np
+
+
+def top_k(counts, k, axis=0):
+    """
+    Ids of the k largest counts, largest first, in O(n + k log k) per column
+
+    Parameters
+    ----------
+    counts : array_like
+        integer counts, indexed by id along axis
+    k : int
+        number of ids to return, all ids if k is larger than the number of ids
+    axis : int
+        axis of counts holding the ids
+
+    Returns
+    -------
+    np.ndarray
+        array shaped like counts with axis shortened to k, holding the selected ids
+    """
+    counts = np.moveaxis(np.asarray(counts, dtype=np.int64), axis, 0)
+    n = counts.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return np.moveaxis(np.zeros((0,) + counts.shape[1:], dtype=np.int64), 0, axis)
+    ids = np.arange(n, dtype=np.int64).reshape((n,) + (1,) * (counts.ndim - 1))
+    # A single unique key per id, larger counts first and lower ids first among equal counts
+    keys = -(counts * n) + ids
+    selected = np.argpartition(keys, k - 1, axis=0)[:k] if k < n else np.broadcast_to(ids, keys.shape).copy()
+    order = np.argsort(np.take_along_axis(keys, selected, axis=0), axis=0)
+    return np.moveaxis(np.take_along_axis(selected, order, axis=0), 0, axis)
+
+
+def rank_trajectory(counts):
+    """
+    Rank of every id in every period, 0 being the id with the most messages
+
+    Parameters
+    ----------
+    counts : array_like
+        (number of ids, number of periods) integer counts
+
+    Returns
+    -------
+    np.ndarray
+        (number of ids, number of periods) array of ranks, row i holds the trajectory of id i over the periods
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    # A stable sort ranks the lower id first among equal counts
+    order = np.argsort(-counts, axis=0, kind='stable')
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.broadcast_to(np.arange(len(counts))[:, None], order.shape), axis=0)
+    return ranks
+
+
+class StreamingTopK:
+    """
+    Top-K of counts which change by small increments, e.g. while a window slides over time
+
+    Every update pushes the new count of an id on a heap, outdated entries are skipped when the top is read. Reading the
+    top k costs O(k log n) and an update O(log n), so consecutive windows are never ranked from scratch.
+    """
+
+    def __init__(self, n):
+        """
+        Parameters
+        ----------
+        n : int
+            number of ids, all counts start at 0
+        """
+        self.counts = np.zeros(n, dtype=np.int64)
+        self._heap = [(0, i) for i in range(n)]
+
+    def update(self, ids, deltas):
+        """
+        Add deltas to the counts of ids
+
+        Parameters
+        ----------
+        ids : array_like
+            ids whose count changed
+        deltas : array_like
+            change of the count of every id, may be negative
+        """
+        for i, delta in zip(np.asarray(ids).tolist(), np.asarray(deltas).tolist()):
+            self.counts[i] += delta
+            heapq.heappush(self._heap, (-int(self.counts[i]), i))
+        # Drop the outdated entries once they outnumber the live ones
+        if len(self._heap) > 2 * len(self.counts) + 64:
+            self._heap = [(-int(c), i) for i, c in enumerate(self.counts)]
+            heapq.heapify(self._heap)
+
+    def top(self, k):
+        """
+        The k largest counts, largest first
+
+        Parameters
+        ----------
+        k : int
+            number of ids to return
+
+        Returns
+        -------
+        list
+            (id, count) tuples
+        """
+        result = []
+        seen = set()
+        while self._heap and len(result) < k:
+            count, i = heapq.heappop(self._heap)
+            # Skip entries of counts which changed since they were pushed
+            if i not in seen and self.counts[i] == -count:
+                seen.add(i)
+                result.append((i, -count))
+        for i, count in result:
+            heapq.heappush(self._heap, (-count, i))
+        return result
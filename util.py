@@ -1,12 +1,13 @@
 # Author: Kyle Bringmans
 
-import json
-import yaml
+from collections import deque
+import heapq
+import importlib
+from itertools import groupby
+from operator import itemgetter
 import os
-import sys
-
-import numpy as np
 import re
+import sys
 
 from termcolor import colored
 
@@ -24,9 +25,130 @@ def listdir_no_hidden(path):
     f : str
         a subdirectory name
     """
-    for directory in os.listdir(path):
-        if not directory.startswith('.'):
-            yield directory
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if not entry.name.startswith('.'):
+                yield entry.name
+
+
+# Number of threads reading files ahead of the parser, set from the 'io_threads' config key
+_io = {'threads': 8}
+
+
+def set_io_threads(n_threads):
+    """
+    Set the number of threads prefetch uses by default
+
+    Parameters
+    ----------
+    n_threads : int
+        number of threads, files are read one after the other by the calling thread if 1 or less
+    """
+    _io['threads'] = n_threads
+
+
+def prefetch(function, items, n_threads=None):
+    """
+    Apply a function to every item on a pool of threads, yielding the results in the order of the items
+
+    Meant for calls which mostly wait on the file system, such as reading files from a network share: while the caller
+    handles one result, the next calls are already running. At most twice the number of threads calls are started ahead
+    of the result being yielded, so the number of results held in memory stays bounded.
+
+    Parameters
+    ----------
+    function : callable
+        called with every item
+    items : iterable
+        the items, consumed lazily
+    n_threads : int, optional
+        number of threads, see set_io_threads for the default
+
+    Returns
+    -------
+    object
+        the result of function for every item
+    """
+    n_threads = _io['threads'] if n_threads is None else n_threads
+    if n_threads <= 1:
+        for item in items:
+            yield function(item)
+        return
+    from concurrent.futures import ThreadPoolExecutor
+    pending = deque()
+    with ThreadPoolExecutor(n_threads) as pool:
+        for item in items:
+            pending.append(pool.submit(function, item))
+            if len(pending) >= 2 * n_threads:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def read_file(path):
+    """
+    Contents of a file as bytes
+    """
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+# JSON decoders in order of preference, 'auto' picks the first one which is installed
+JSON_BACKENDS = ('orjson', 'simdjson', 'json')
+# Decoder used by decode_json, chosen on first use
+_json_decoder = {'name': None, 'loads': None}
+
+
+def set_json_backend(backend='auto'):
+    """
+    Select the JSON decoder used to parse message files
+
+    Parameters
+    ----------
+    backend : str
+        one of JSON_BACKENDS, or 'auto' for the fastest installed backend
+
+    Returns
+    -------
+    str
+        name of the selected backend
+
+    Raises
+    ------
+    ImportError
+        if the requested backend is not installed
+    """
+    names = JSON_BACKENDS if backend == 'auto' else (backend,)
+    for name in names:
+        try:
+            module = importlib.import_module(name)
+        except ImportError:
+            if backend != 'auto':
+                raise
+            continue
+        # All backends offer a json.loads compatible function accepting bytes
+        _json_decoder['name'] = name
+        _json_decoder['loads'] = module.loads
+        return name
+
+
+def decode_json(raw):
+    """
+    Decode a JSON document with the selected backend
+
+    Parameters
+    ----------
+    raw : bytes
+        the encoded document
+
+    Returns
+    -------
+    object
+        the decoded document
+    """
+    if _json_decoder['loads'] is None:
+        set_json_backend()
+    return _json_decoder['loads'](raw)
 
 
 def get_color():
@@ -38,41 +160,311 @@ def get_color():
     list
         list of 3 random floats which represents an RGB colour
     """
+    # Imported here so scripts which do not plot never load numpy through util
+    import numpy as np
     while True:
         yield np.random.uniform(low=0, high=1, size=(3,))
 
 
-def get_messages(path_to_folders, interactions=False, clean_names=True):
-    # List all contacts
-    ppl = listdir_no_hidden(path_to_folders)
+def iter_message_files(path_to_folders, contacts=None):
+    """
+    Yield every message file of the inbox
 
-    # Count number of interactions
-    messages = {}
-    # Iterate over all contacts
-    for p in ppl:
-        # Get proper name of person without suffix and add space between name and surname
-        if clean_names:
-            p_name = re.sub(r"(\w)([A-Z])", r"\1 \2", p.split('_')[0])
-        else:
-            p_name = p
+    Parameters
+    ----------
+    path_to_folders : str
+        path to the inbox folder containing one folder per contact
+    contacts : iterable of str, optional
+        only yield the files of these contact folders, all contacts if None
+
+    Returns
+    -------
+    (str, str)
+        the contact folder name and the message file name within that folder
+    """
+    def list_folder(p):
         try:
-            p_path = path_to_folders + '/' + p
-            # Iterate over all message files for contact p
-            for fn in listdir_no_hidden(p_path):
-                if 'message' in fn:
-                    with open(p_path + '/' + fn) as json_file:
-                        data = json.load(json_file)
-                        # Add total interactions to existing count for person p
-                        if interactions:
-                            messages[p_name] = messages.get(p_name, 0) + len(data['messages'])
-                        else:
-                            messages[p_name] = messages.get(p_name, []) + data['messages']
-        except FileNotFoundError as error:
+            # All message files for contact p
+            return p, [fn for fn in listdir_no_hidden(path_to_folders + '/' + p) if 'message' in fn]
+        except (FileNotFoundError, NotADirectoryError) as error:
             print("ERROR key {} not found in dict".format(error))
-    return messages
+            return p, []
+
+    if contacts is None:
+        contacts = listdir_no_hidden(path_to_folders)
+    # The contact folders are listed ahead on the I/O threads
+    for p, f_names in prefetch(list_folder, contacts):
+        for fn in f_names:
+            yield p, fn
+
+
+def iter_message_bytes(path_to_folders, contacts=None):
+    """
+    Yield the contents of every message file of the inbox, the next files are read on the I/O threads meanwhile
+
+    Parameters
+    ----------
+    path_to_folders : str
+        path to the inbox folder containing one folder per contact
+    contacts : iterable of str, optional
+        only yield the files of these contact folders, all contacts if None
+
+    Returns
+    -------
+    (str, str, bytes)
+        the contact folder name, the message file name within that folder and the contents of the file
+    """
+    def read(p_fn):
+        return p_fn + (read_file(path_to_folders + '/' + p_fn[0] + '/' + p_fn[1]),)
+
+    return prefetch(read, iter_message_files(path_to_folders, contacts))
+
+
+def iter_messages(path_to_folders, contacts=None, fields=('timestamp_ms', 'sender_name')):
+    """
+    Yield the messages of the inbox, only one message file is decoded at a time
+
+    Parameters
+    ----------
+    path_to_folders : str
+        path to the inbox folder containing one folder per contact
+    contacts : iterable of str, optional
+        only yield the messages of these contact folders, all contacts if None
+    fields : tuple of str, optional
+        message keys to keep, a key missing from a message is None. The full message dict is yielded if None
+
+    Returns
+    -------
+    (str, tuple or dict)
+        the contact folder name and the message record
+    """
+    for p, _, raw in iter_message_bytes(path_to_folders, contacts):
+        data = decode_json(raw)
+        if fields is None:
+            for m in data['messages']:
+                yield p, m
+        else:
+            for m in data['messages']:
+                yield p, tuple(m.get(field) for field in fields)
+
+
+# The "timestamp_ms" key of a message, JSON allows white space between a key and its colon
+_TIMESTAMP_KEY = re.compile(rb'"timestamp_ms"\s*:')
+
+
+def count_messages(path_to_folders, contacts=None, summary=None):
+    """
+    Count the messages of every contact without decoding the message files
+
+    Every message has exactly one "timestamp_ms" key. The text "timestamp_ms" can also be the value of a field such as
+    the content of a message, but only a key is followed by a colon: a quote inside a string is escaped and a string
+    value is followed by a comma or a closing bracket. Counting the key with its colon in the raw bytes of a file
+    therefore gives the number of messages in that file.
+
+    Parameters
+    ----------
+    path_to_folders : str
+        path to the inbox folder containing one folder per contact
+    contacts : iterable of str, optional
+        only count the messages of these contact folders, all contacts if None
+    summary : dict, optional
+        cached per-file summary such as the manifest of the message store: path relative to the inbox -> dict with
+        'size', 'mtime_ns' and 'messages'. Files whose size and modification time match are not read
+
+    Returns
+    -------
+    dict
+        contact folder name -> number of messages
+    """
+    def count(p_fn):
+        p, fn = p_fn
+        f_path = path_to_folders + '/' + p + '/' + fn
+        entry = summary.get(p + '/' + fn) if summary else None
+        if entry is not None and 'messages' in entry:
+            stat = os.stat(f_path)
+            if entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+                return p, entry['messages']
+        return p, len(_TIMESTAMP_KEY.findall(read_file(f_path)))
+
+    interactions = {}
+    # Files are stat-ed and read on the I/O threads
+    for p, n_messages in prefetch(count, iter_message_files(path_to_folders, contacts)):
+        interactions[p] = interactions.get(p, 0) + n_messages
+    return interactions
+
+
+# Message keys get_messages can keep and their numpy type. Text keys are interned, the record holds the index of the
+# text in a shared list of strings. For list keys such as 'reactions' and 'photos' the record holds the length
+MESSAGE_FIELDS = {'timestamp_ms': 'i8', 'sender_name': 'i4', 'type': 'i4', 'reactions': 'i2', 'photos': 'i2',
+                  'call_duration': 'i8'}
+_TEXT_FIELDS = ('sender_name', 'type')
+_LIST_FIELDS = ('reactions', 'photos')
+
+
+def message_dtype(fields=('timestamp_ms', 'sender_name')):
+    """
+    Numpy structured type of the message records returned by get_messages
+
+    Parameters
+    ----------
+    fields : tuple of str
+        message keys to keep, any of MESSAGE_FIELDS
+
+    Returns
+    -------
+    np.dtype
+        packed structured type with one field per key
+    """
+    import numpy as np
+    unknown = [field for field in fields if field not in MESSAGE_FIELDS]
+    if unknown:
+        raise ValueError("Unknown message fields {}, expected any of {}".format(unknown, tuple(MESSAGE_FIELDS)))
+    return np.dtype([(field, MESSAGE_FIELDS[field]) for field in fields])
+
+
+def compact_messages(messages, fields=('timestamp_ms', 'sender_name'), strings=None, string_ids=None):
+    """
+    Convert decoded message dicts into a structured array holding only the requested keys
+
+    Parameters
+    ----------
+    messages : list of dict
+        decoded messages, e.g. the 'messages' list of a message file
+    fields : tuple of str
+        message keys to keep, any of MESSAGE_FIELDS. A key missing from a message is stored as 0 or the empty string
+    strings : list, optional
+        interned texts, new texts are appended with their encoding repaired, see identity.fix_encoding
+    string_ids : dict, optional
+        text as exported -> index into strings, new texts are added
+
+    Returns
+    -------
+    np.ndarray
+        one record of message_dtype(fields) per message
+    """
+    import numpy as np
+    from identity import fix_encoding
+    strings = [] if strings is None else strings
+    string_ids = {} if string_ids is None else string_ids
+
+    def intern(text):
+        i = string_ids.get(text)
+        if i is None:
+            # Names are repaired once, when they are first seen
+            i = string_ids[text] = len(strings)
+            strings.append(fix_encoding(text))
+        return i
+
+    getters = []
+    for field in fields:
+        if field in _TEXT_FIELDS:
+            getters.append(lambda m, field=field: intern(m.get(field, '')))
+        elif field in _LIST_FIELDS:
+            getters.append(lambda m, field=field: len(m.get(field, ())))
+        else:
+            getters.append(lambda m, field=field: m.get(field, 0))
+    return np.array([tuple(get(m) for get in getters) for m in messages], dtype=message_dtype(fields))
+
+
+def get_messages(path_to_folders, interactions=False, clean_names=True, fields=('timestamp_ms', 'sender_name')):
+    """
+    Collect the messages of every contact
+
+    Messages are kept as compact records of only the requested keys, a record of the default fields takes 12 bytes
+    where a decoded message dict takes well over a kilobyte.
+
+    Parameters
+    ----------
+    path_to_folders : str
+        path to the inbox folder containing one folder per contact
+    interactions : bool
+        only count the messages instead of returning them, the files are skimmed instead of decoded
+    clean_names : bool
+        key the result on contact names without folder suffix, folders with the same contact name are merged
+    fields : tuple of str, optional
+        message keys to keep, any of MESSAGE_FIELDS. The full message dicts are returned if None
+
+    Returns
+    -------
+    (dict, list) or dict
+        contact -> structured array of message_dtype(fields), contacts with the most messages first, and the interned
+        texts the text fields of the records index, e.g. strings[records['sender_name'][0]] is the name of the sender
+        of the first message. A single dict of contact -> list of message dicts if fields is None, or contact ->
+        number of messages if interactions is set
+    """
+    from identity import display_name
+    # Display name of every contact folder seen so far
+    names = {}
+
+    def contact_name(p):
+        if p not in names:
+            names[p] = display_name(p) if clean_names else p
+        return names[p]
+
+    messages = {}
+    if interactions:
+        # Add interactions to existing count for person p
+        for p, count in count_messages(path_to_folders).items():
+            messages[contact_name(p)] = messages.get(contact_name(p), 0) + count
+        return messages
+    if fields is None:
+        for p, m in iter_messages(path_to_folders, fields=None):
+            messages.setdefault(contact_name(p), []).append(m)
+        return messages
+
+    return get_top_messages(path_to_folders, None, fields, clean_names)
+
+
+def get_top_messages(path_to_folders, n=None, fields=('timestamp_ms', 'sender_name'), clean_names=True):
+    """
+    Rank the contacts by number of messages and return the messages of the top-n in a single pass over the inbox
+
+    Only the compact records of the current top-n contact folders and of the folder being read are held in memory, the
+    decoded message dicts of a file are freed before the next file is decoded.
+
+    Parameters
+    ----------
+    path_to_folders : str
+        path to the inbox folder containing one folder per contact
+    n : int, optional
+        number of contact folders to return, all folders if None
+    fields : tuple of str
+        message keys to keep, any of MESSAGE_FIELDS
+    clean_names : bool
+        key the result on contact names without folder suffix, returned folders with the same contact name are merged
+
+    Returns
+    -------
+    (dict, list)
+        contact -> structured array of message_dtype(fields), contacts with the most messages first, and the interned
+        texts the text fields of the records index
+    """
+    import numpy as np
+    from identity import display_name
+    strings = []
+    string_ids = {}
+    # Min-heap of (number of messages, -rank of discovery, contact folder, records), the smallest is dropped first
+    top = []
+    for i, (p, files) in enumerate(groupby(iter_message_bytes(path_to_folders), key=itemgetter(0))):
+        parts = [np.zeros(0, dtype=message_dtype(fields))]
+        for _, _, raw in files:
+            parts.append(compact_messages(decode_json(raw)['messages'], fields, strings, string_ids))
+        entry = (sum(len(part) for part in parts), -i, p, np.concatenate(parts))
+        if n is None or len(top) < n:
+            heapq.heappush(top, entry)
+        elif top and entry[:2] > top[0][:2]:
+            heapq.heapreplace(top, entry)
+
+    messages = {}
+    for _, _, p, records in sorted(top, reverse=True, key=lambda entry: entry[:2]):
+        name = display_name(p) if clean_names else p
+        messages[name] = np.concatenate((messages[name], records)) if name in messages else records
+    return messages, strings
 
 
 def get_params_from_config(path):
+    import yaml
+
     with open(path, 'r') as stream:
         try:
             params = yaml.safe_load(stream)
@@ -83,6 +475,13 @@ def get_params_from_config(path):
     f_name = path_to_script.split('/')[-1]
     image_name = f_name.replace('.py', '.png')
     params['f_name'] = image_name
+    if params.get('io_threads') is not None:
+        set_io_threads(params['io_threads'])
+    if 'json_backend' in params:
+        params['json_backend'] = set_json_backend(params['json_backend'])
+    if params.get('profile'):
+        from profiling import enable_profiling
+        enable_profiling(params['profile'])
 
     print(colored("Arguments used:\n", 'green'))
 